@@ -0,0 +1,136 @@
+# src/api/batching.py
+"""
+Dynamic micro-batching for model inference.
+
+Concurrent requests call `await batcher.submit(item)`. A single background
+task collects items until max_batch_size are waiting or max_wait_ms has
+passed since the first one arrived, runs `fn(items)` once in a thread, and
+hands each caller its own result. Under load this replaces N batch-of-one
+forward passes with a few full batches; a lone request waits at most
+max_wait_ms extra.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Callable, List
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+PREDICT_MAX_BATCH = int(os.environ.get("KOLAM_PREDICT_MAX_BATCH", "16"))
+PREDICT_MAX_WAIT_MS = float(os.environ.get("KOLAM_PREDICT_MAX_WAIT_MS", "5"))
+PREDICT_MAX_QUEUE = int(os.environ.get("KOLAM_PREDICT_MAX_QUEUE", "256"))
+
+
+class MicroBatcher:
+    """Groups concurrent single-item calls into batched calls of fn(items) -> results."""
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch_size: int, max_wait_ms: float, max_queue: int):
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max(1, max_queue)
+        self._queue = None
+        self._task = None
+        self.stats = {
+            "requests": 0,
+            "batches": 0,
+            "rejected": 0,
+            "failed_batches": 0,
+            "batch_sizes": {},
+            "queue_ms_total": 0.0,
+            "queue_ms_max": 0.0,
+            "batch_ms_total": 0.0,
+        }
+
+    def _start(self) -> None:
+        # Created on first use so they belong to the server's event loop
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item: Any) -> Any:
+        """Queues one item and waits for its result from the next batch."""
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many predictions queued, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.stats["requests"] += 1
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Anything already queued rides along without further waiting
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (client disconnect) don't need a forward pass
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                queue_ms = (started - enqueued) * 1000
+                self.stats["queue_ms_total"] += queue_ms
+                self.stats["queue_ms_max"] = max(self.stats["queue_ms_max"], queue_ms)
+            size = len(batch)
+            self.stats["batches"] += 1
+            self.stats["batch_sizes"][size] = self.stats["batch_sizes"].get(size, 0) + 1
+
+            try:
+                results = await run_in_threadpool(self.fn, [item for item, _, _ in batch])
+            except Exception as e:
+                self.stats["failed_batches"] += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            self.stats["batch_ms_total"] += (time.perf_counter() - started) * 1000
+
+    def status(self) -> dict:
+        batches = self.stats["batches"] or 1
+        processed = sum(size * count for size, count in self.stats["batch_sizes"].items())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_queue": self.max_queue,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "requests": self.stats["requests"],
+            "batches": self.stats["batches"],
+            "rejected": self.stats["rejected"],
+            "failed_batches": self.stats["failed_batches"],
+            "batch_sizes": dict(sorted(self.stats["batch_sizes"].items())),
+            "avg_batch_size": round(processed / batches, 2),
+            "avg_queue_ms": round(self.stats["queue_ms_total"] / (processed or 1), 3),
+            "max_queue_ms": round(self.stats["queue_ms_max"], 3),
+            "avg_batch_ms": round(self.stats["batch_ms_total"] / batches, 3),
+        }
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
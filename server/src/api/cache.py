@@ -0,0 +1,267 @@
+# src/api/cache.py
+"""
+Bounded result caches for expensive endpoints.
+
+Two interchangeable backends with the same get/set/stats interface:
+
+- MemoryCache: per-process LRU with TTL and an entry/byte budget.
+- SQLiteCache: on-disk LRU with TTL and a byte budget, shared by every
+  uvicorn worker on the host and kept across restarts. Hit/miss/eviction
+  counters are stored in the database so they cover all workers.
+
+Values must be JSON-serializable. `make_cache` picks the backend from the
+KOLAM_CACHE_* environment variables. `FileCache` keeps binary blobs (e.g.
+encoded thumbnails) as files instead.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+CACHE_BACKEND = os.environ.get("KOLAM_CACHE_BACKEND", "sqlite")
+CACHE_DIR = os.environ.get("KOLAM_CACHE_DIR", "cache")
+CACHE_MAX_BYTES = int(os.environ.get("KOLAM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL = float(os.environ.get("KOLAM_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+class MemoryCache:
+    """In-process LRU cache with optional TTL (seconds) and size budget."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = CACHE_MAX_BYTES, ttl: Optional[float] = CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, int, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            created, size, payload = entry
+            if self.ttl and time.time() - created > self.ttl:
+                self._remove(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return json.loads(payload)
+
+    def set(self, key: str, value: Any) -> None:
+        payload = json.dumps(value)
+        size = len(payload)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (time.time(), size, payload)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries), "bytes": self._bytes, **self._stats}
+
+
+class SQLiteCache:
+    """
+    On-disk LRU cache with optional TTL (seconds) and a byte budget.
+    Safe to share between processes; SQLite serializes the writers.
+    """
+
+    def __init__(self, path: str, max_bytes: int = CACHE_MAX_BYTES, ttl: Optional[float] = CACHE_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        for name in ("hits", "misses", "evictions", "expired"):
+            self._conn.execute("INSERT OR IGNORE INTO stats VALUES (?, 0)", (name,))
+
+    def _count(self, name: str, n: int = 1) -> None:
+        if n:
+            self._conn.execute("UPDATE stats SET value = value + ? WHERE name = ?", (n, name))
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            payload, created = row
+            if self.ttl and now - created > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._count("expired")
+                self._count("misses")
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._count("hits")
+        return json.loads(payload)
+
+    def set(self, key: str, value: Any) -> None:
+        payload = json.dumps(value)
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, size, now, now),
+                )
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self) -> None:
+        """Drops expired entries, then least recently used ones until under the byte budget."""
+        if self.ttl:
+            expired = self._conn.execute(
+                "DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,)
+            ).rowcount
+            self._count("expired", expired)
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._count("evictions", evicted)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+        return {"backend": "sqlite", "path": self.path, "entries": entries, "bytes": total, **counters}
+
+
+class FileCache:
+    """
+    On-disk LRU cache of bytes values, one file per key under `directory`.
+    Hits bump the file's mtime; when a write takes the directory over
+    max_bytes, the least recently used files are deleted. Several processes
+    may share the directory, so the byte total is re-read from disk on eviction.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(size for _, size, _ in self._scan())
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def _scan(self) -> list:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+        return data
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._bytes += len(value)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Deletes least recently used files until under 90% of the budget."""
+        entries = sorted(self._scan(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self._stats["evictions"] += 1
+        self._bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "files", "path": self.directory, "bytes": self._bytes, **self._stats}
+
+
+def make_cache(name: str, backend: str = CACHE_BACKEND, max_bytes: int = CACHE_MAX_BYTES, ttl: Optional[float] = CACHE_TTL):
+    """Creates the named cache with the configured backend ("sqlite" or "memory")."""
+    if backend == "memory":
+        return MemoryCache(max_bytes=max_bytes, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteCache(os.path.join(CACHE_DIR, f"{name}.sqlite3"), max_bytes=max_bytes, ttl=ttl)
+    raise ValueError(f"Unknown cache backend: {backend}")
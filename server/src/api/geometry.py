@@ -0,0 +1,114 @@
+# src/api/geometry.py
+"""
+Struct-of-arrays kolam geometry.
+
+`PathArrays` holds a kolam as three float arrays: dots (N x 2), lines
+(N x 4: x1, y1, x2, y2) and curves (N x 6: x1, y1, cx, cy, x2, y2).
+Symmetry groups are stacks of 2 x 2 matrices, so every path is transformed
+by a single batched matmul instead of point by point.
+"""
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+# Exact integer matrices (column vectors, y axis pointing down like SVG)
+_ROTATIONS = [
+    [[1, 0], [0, 1]],    # 0
+    [[0, -1], [1, 0]],   # 90
+    [[-1, 0], [0, -1]],  # 180
+    [[0, 1], [-1, 0]],   # 270
+]
+_REFLECTIONS = [
+    [[-1, 0], [0, 1]],   # mirror across the vertical axis
+    [[0, 1], [1, 0]],    # across the main diagonal
+    [[1, 0], [0, -1]],   # across the horizontal axis
+    [[0, -1], [-1, 0]],  # across the anti-diagonal
+]
+SYMMETRY_GROUPS = {
+    "c4": np.array(_ROTATIONS, dtype=float),
+    "d4": np.array(_ROTATIONS + _REFLECTIONS, dtype=float),
+    "reflection": np.array(_ROTATIONS[:1] + _REFLECTIONS[:1], dtype=float),
+}
+
+
+# Path endpoints that agree to this many px are treated as the same dots
+# (the SVG is written to 1/100 px)
+DEDUP_PRECISION = 0.01
+
+
+def _rows(values, width: int) -> np.ndarray:
+    return np.asarray(values, dtype=float).reshape(-1, width)
+
+
+def canonical_keys(array: np.ndarray, precision: float = DEDUP_PRECISION) -> np.ndarray:
+    """
+    Quantized, direction-independent keys for N x 4 line or N x 6 curve rows.
+
+    A line's key is its unordered endpoint pair. A curve's key is its
+    unordered endpoint pair plus the side of the chord its control point is
+    on: loops joining the same two dots and bulging the same way are one
+    path, whatever their exact bulge.
+    """
+    quantized = np.round(array / precision).astype(np.int64)
+    start, end = quantized[:, :2], quantized[:, -2:]
+    swap = ((end[:, 0] < start[:, 0]) | ((end[:, 0] == start[:, 0]) & (end[:, 1] < start[:, 1])))[:, None]
+    first, second = np.where(swap, end, start), np.where(swap, start, end)
+    if array.shape[1] == 4:
+        return np.hstack([first, second])
+    chord, arm = second - first, quantized[:, 2:4] - first
+    side = np.sign(chord[:, 0] * arm[:, 1] - chord[:, 1] * arm[:, 0])
+    return np.hstack([first, second, side[:, None]])
+
+
+def unique_rows(array: np.ndarray, precision: float = DEDUP_PRECISION) -> np.ndarray:
+    """Drops rows whose canonical key was already seen, keeping the first in order."""
+    if len(array) < 2:
+        return array
+    _, first = np.unique(canonical_keys(array, precision), axis=0, return_index=True)
+    return array[np.sort(first)]
+
+
+def transform(points: np.ndarray, matrices: np.ndarray, center: Sequence[float]) -> np.ndarray:
+    """
+    Applies G matrices about center to an N x 2k array of k points per row.
+    Returns N x G x 2k: every transformed copy of a row is kept together.
+    """
+    n, width = points.shape
+    center = np.asarray(center, dtype=float)
+    local = points.reshape(n, width // 2, 2) - center
+    moved = local[:, None] @ matrices.transpose(0, 2, 1) + center
+    return moved.reshape(n, len(matrices), width)
+
+
+class PathArrays:
+    """Dots, lines and curves of a kolam as float arrays."""
+
+    __slots__ = ("dots", "lines", "curves")
+
+    def __init__(self, dots=None, lines=None, curves=None):
+        self.dots = _rows(() if dots is None else dots, 2)
+        self.lines = _rows(() if lines is None else lines, 4)
+        self.curves = _rows(() if curves is None else curves, 6)
+
+    def __len__(self) -> int:
+        return len(self.lines) + len(self.curves)
+
+    @classmethod
+    def from_paths(cls, paths: Iterable, dots: Optional[Iterable] = None) -> "PathArrays":
+        """
+        Packs path objects (schemas or the recreator's classes: anything with
+        p1/p2 and an optional ctrl) and (x, y) dot tuples or Dot objects.
+        """
+        lines, curves = [], []
+        for path in paths:
+            ctrl = getattr(path, "ctrl", None)
+            if ctrl is None:
+                lines.append((path.p1.x, path.p1.y, path.p2.x, path.p2.y))
+            else:
+                curves.append((path.p1.x, path.p1.y, ctrl.x, ctrl.y, path.p2.x, path.p2.y))
+        points = [(d.x, d.y) if hasattr(d, "x") else d for d in dots or ()]
+        return cls(points, lines, curves)
+
+    def deduplicate(self, precision: float = DEDUP_PRECISION) -> "PathArrays":
+        """Copy without repeated lines or curves (see canonical_keys); dots are kept."""
+        return PathArrays(self.dots, unique_rows(self.lines, precision), unique_rows(self.curves, precision))
@@ -1,16 +1,150 @@
 import numpy as np
 import math
+import time
 import cv2
-from sklearn.cluster import DBSCAN
+from scipy.spatial import cKDTree
 
 from src.api.schemas import Dot, LinePath, CurvePath
 
-def detect_dots_in_image(img):
-    """Detect dots in the kolam image using advanced computer vision techniques"""
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    
+# Part of every cached detection key: bump it whenever detection output
+# (dots, paths or their schema) changes, so stale cached results are ignored
+DETECTOR_VERSION = 2
+
+class KolamAnalysis:
+    """
+    Shared preprocessing for one uploaded image.
+
+    Each intermediate (gray, CLAHE, Otsu threshold, Canny edges, contours) is
+    computed on first use and reused by every later stage. `timings` records
+    the seconds spent in each stage.
+
+    With `max_pixels`, detection runs on a copy downscaled to that pixel
+    budget and every coordinate is mapped back to the original frame;
+    `refine` then re-centres each dot on the full-resolution image, looking
+    only at a small window around it.
+    """
+
+    def __init__(self, img, max_pixels=None, refine=False):
+        self.img = img
+        self.height, self.width = img.shape[:2]
+        self.scale = 1.0
+        if max_pixels and self.height * self.width > max_pixels:
+            self.scale = math.sqrt(max_pixels / (self.height * self.width))
+        self.refine = refine
+        self.timings = {}
+        self._stages = {}
+
+    def _stage(self, name, compute):
+        if name not in self._stages:
+            start = time.perf_counter()
+            self._stages[name] = compute()
+            self.timings[name] = time.perf_counter() - start
+        return self._stages[name]
+
+    @property
+    def work(self):
+        """The image detection runs on: the upload itself, or its downscaled copy"""
+        if self.scale == 1.0:
+            return self.img
+        size = (max(1, round(self.width * self.scale)), max(1, round(self.height * self.scale)))
+        return self._stage("resize", lambda: cv2.resize(self.img, size, interpolation=cv2.INTER_AREA))
+
+    @property
+    def gray(self):
+        return self._stage("gray", lambda: cv2.cvtColor(self.work, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def clahe(self):
+        """Contrast-equalized gray image, for uneven lighting and faint dots"""
+        def compute():
+            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+            return clahe.apply(self.gray)
+        return self._stage("clahe", compute)
+
+    @property
+    def thresh(self):
+        """Otsu-thresholded binary image with the kolam strokes as foreground"""
+        return self._stage("thresh", lambda: cv2.threshold(
+            self.gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1])
+
+    @property
+    def edges(self):
+        return self._stage("edges", lambda: cv2.Canny(self.thresh, 50, 150))
+
+    @property
+    def contours(self):
+        return self._stage("contours", lambda: cv2.findContours(
+            self.thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0])
+
+    def to_original(self, points):
+        """Map (x, y) rows from detection coordinates back to the original frame"""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        return points if self.scale == 1.0 else points / self.scale
+
+    def detect_dots(self, enhanced=False):
+        """Detect dots, optionally on the CLAHE-enhanced image"""
+        suffix = "_enhanced" if enhanced else ""
+
+        def compute():
+            dots = detect_dots_in_image(self.img, analysis=self, enhanced=enhanced)
+            if self.refine and self.scale < 1.0:
+                dots = self._stage("refine" + suffix, lambda: refine_dots(self.img, dots, radius=self._refine_windows(dots, enhanced)))
+            return dots
+        return self._stage("dots" + suffix, compute)
+
+    def dot_candidates(self, enhanced=False):
+        """(x, y, radius) found by each dot detector, in detection coordinates"""
+        return self._stage(
+            "candidates_enhanced" if enhanced else "candidates",
+            lambda: find_dot_candidates(self.clahe if enhanced else self.gray),
+        )
+
+    def _refine_windows(self, dots, enhanced):
+        """
+        Full-resolution half-size of each dot's refine window: DOT_WINDOW
+        detection pixels, or twice the largest radius detected around the
+        dot, so the window holds the whole dot and background around it
+        """
+        candidates = np.asarray(self.dot_candidates(enhanced), dtype=float).reshape(-1, 3)
+        windows = np.full(len(dots), float(DOT_WINDOW))
+        if len(candidates) and len(dots):
+            tree = cKDTree(candidates[:, :2])
+            for i, near in enumerate(tree.query_ball_point(np.asarray(dots, dtype=float) * self.scale, DOT_MERGE_EPS)):
+                if near:
+                    windows[i] = max(DOT_WINDOW, 2 * candidates[near, 2].max())
+        return [round(w / self.scale) for w in windows]
+
+    def detect_paths(self, enhanced=False):
+        """Detect lines and curves, snapped to this image's (optionally enhanced) dots"""
+        return self._stage(
+            "paths_enhanced" if enhanced else "paths",
+            lambda: detect_lines_and_curves(self.img, self.detect_dots(enhanced), analysis=self),
+        )
+
+    def detect(self):
+        """Run dot and path detection; returns (dots, lines, curves)"""
+        dots = self.detect_dots()
+        lines, curves = self.detect_paths()
+        return dots, lines, curves
+
+    def report(self):
+        """Resolution and per-stage timings, for returning alongside results"""
+        return {
+            "scale": round(self.scale, 4),
+            "detection_size": [self.gray.shape[1], self.gray.shape[0]],
+            # Full-resolution pixels per detection pixel (the run time is in timings_ms)
+            "pixel_reduction": round(1 / (self.scale * self.scale), 2),
+            "timings_ms": {name: round(t * 1000, 2) for name, t in self.timings.items()},
+        }
+
+
+def find_dot_candidates(gray):
+    """
+    Dot candidates from every detection strategy, as (x, y, radius) in the
+    coordinates of `gray`. Corners carry no size, so their radius is 0.
+    """
     # Multiple detection strategies
-    detected_points = []
+    candidates = []
     
     # Strategy 1: HoughCircles for circular dots
     circles = cv2.HoughCircles(
@@ -21,7 +155,7 @@ def detect_dots_in_image(img):
     if circles is not None:
         circles = np.round(circles[0, :]).astype("int")
         for (x, y, r) in circles:
-            detected_points.append((x, y))
+            candidates.append((x, y, r))
     
     # Strategy 2: Corner detection for dot intersections
     corners = cv2.goodFeaturesToTrack(
@@ -31,7 +165,7 @@ def detect_dots_in_image(img):
     if corners is not None:
         for corner in corners:
             x, y = corner.ravel()
-            detected_points.append((int(x), int(y)))
+            candidates.append((int(x), int(y), 0))
     
     # Strategy 3: Blob detection
     params = cv2.SimpleBlobDetector_Params()
@@ -45,52 +179,131 @@ def detect_dots_in_image(img):
     keypoints = detector.detect(gray)
     
     for kp in keypoints:
-        detected_points.append((int(kp.pt[0]), int(kp.pt[1])))
+        candidates.append((int(kp.pt[0]), int(kp.pt[1]), kp.size / 2))
+    
+    return candidates
+
+
+def detect_dots_in_image(img, analysis=None, enhanced=False):
+    """Detect dots in the kolam image using advanced computer vision techniques"""
+    analysis = analysis or KolamAnalysis(img)
+    gray = analysis.clahe if enhanced else analysis.gray
+    
+    detected_points = [(x, y) for x, y, _ in analysis.dot_candidates(enhanced)]
     
     if not detected_points:
         # Fallback: Create regular grid based on image dimensions
-        h, w = gray.shape
+        h, w = analysis.height, analysis.width
         # Determine grid size based on image analysis
-        grid_size = determine_grid_size(gray)
+        grid_size = determine_grid_size(gray, thresh=None if enhanced else analysis.thresh)
         return create_regular_grid(w, h, grid_size)
     
     # Cluster similar points to remove duplicates
     if len(detected_points) > 1:
-        clustering = DBSCAN(eps=15, min_samples=1).fit(detected_points)
-        unique_points = []
-        for cluster_id in set(clustering.labels_):
-            cluster_points = [detected_points[i] for i in range(len(detected_points)) 
-                            if clustering.labels_[i] == cluster_id]
-            # Take centroid of cluster
-            center_x = int(np.mean([p[0] for p in cluster_points]))
-            center_y = int(np.mean([p[1] for p in cluster_points]))
-            unique_points.append((center_x, center_y))
-        detected_points = unique_points
+        detected_points = merge_close_points(detected_points)
+    
+    if analysis.scale != 1.0:
+        detected_points = [(int(round(x)), int(round(y))) for x, y in analysis.to_original(detected_points)]
     
     return detected_points
 
 
-def determine_grid_size(gray):
+# Smallest refine window half-size, in detection pixels (dots without a radius get this)
+DOT_WINDOW = 8
+
+
+def refine_dots(img, dots, radius):
+    """
+    Re-centre dots found on a downscaled image using the full-resolution image.
+
+    Only a (2 * radius + 1) square window around each dot is converted and
+    thresholded (`radius` is one size for all dots, or one per dot); the dot is moved to the centroid of the blob under it. Dots
+    whose window has no isolated blob at the centre are left as they are.
+    """
+    h, w = img.shape[:2]
+    radii = [radius] * len(dots) if np.isscalar(radius) else radius
+    refined = []
+    for (x, y), radius in zip(dots, radii):
+        x, y = min(max(x, 0), w - 1), min(max(y, 0), h - 1)
+        x0, y0 = max(0, x - radius), max(0, y - radius)
+        x1, y1 = min(w, x + radius + 1), min(h, y + radius + 1)
+        if x1 - x0 < 3 or y1 - y0 < 3:
+            refined.append((x, y))
+            continue
+        
+        roi = cv2.cvtColor(img[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        _, mask = cv2.threshold(roi, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        # The dot is whichever class the window centre falls in (dark or chalk-white dots)
+        if mask[y - y0, x - x0] == 0:
+            mask = cv2.bitwise_not(mask)
+        _, labels, stats, centroids = cv2.connectedComponentsWithStats(mask)
+        label = labels[y - y0, x - x0]
+        
+        # A blob filling most of the window is a stroke or background, not a dot
+        if stats[label, cv2.CC_STAT_AREA] > 0.5 * mask.size:
+            refined.append((x, y))
+            continue
+        cx, cy = centroids[label]
+        refined.append((int(round(x0 + cx)), int(round(y0 + cy))))
+    return refined
+
+
+DOT_MERGE_EPS = 15
+
+
+def merge_close_points(points, eps=DOT_MERGE_EPS):
+    """
+    Merge chains of points closer than eps into their (truncated) centroids.
+
+    Equivalent to DBSCAN(eps, min_samples=1): points are hashed into eps-sized
+    grid cells, so each point is only compared against its 3x3 cell
+    neighbourhood, and linked points are joined with union-find. Clusters
+    come out in order of their first point.
+    """
+    pts = np.asarray(points, dtype=float).reshape(-1, 2)
+    n = len(pts)
+    
+    cells = {}
+    for i, cell in enumerate(map(tuple, np.floor(pts / eps).astype(int))):
+        cells.setdefault(cell, []).append(i)
+    
+    parent = np.arange(n)
+    
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    for (cx, cy), members in cells.items():
+        neighbours = [j for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                      for j in cells.get((cx + dx, cy + dy), ())]
+        members = np.array(members)
+        neighbours = np.array(neighbours)
+        dist_sq = ((pts[members, None, :] - pts[None, neighbours, :]) ** 2).sum(axis=2)
+        for a, b in zip(*np.nonzero(dist_sq <= eps * eps)):
+            root_a, root_b = find(members[a]), find(neighbours[b])
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+    
+    # Roots are the smallest index of each cluster, so sorting them keeps first-seen order
+    roots = np.array([find(i) for i in range(n)])
+    _, labels = np.unique(roots, return_inverse=True)
+    counts = np.bincount(labels)
+    center_x = np.bincount(labels, weights=pts[:, 0]) / counts
+    center_y = np.bincount(labels, weights=pts[:, 1]) / counts
+    return [(int(x), int(y)) for x, y in zip(center_x, center_y)]
+
+
+def determine_grid_size(gray, thresh=None):
     """Determine the grid size of the kolam based on image analysis"""
     # Analyze the image to determine likely grid dimensions
     h, w = gray.shape
     
-    # Use edge detection to find structure
-    edges = cv2.Canny(gray, 50, 150)
-    
-    # Find horizontal and vertical lines
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (w//10, 1))
-    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, h//10))
-    
-    horizontal_lines = cv2.morphologyEx(edges, cv2.MORPH_OPEN, horizontal_kernel)
-    vertical_lines = cv2.morphologyEx(edges, cv2.MORPH_OPEN, vertical_kernel)
-    
-    # Count intersections to estimate grid size
-    combined = cv2.add(horizontal_lines, vertical_lines)
-    contours, _ = cv2.findContours(combined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
     # Estimate grid size based on content density
-    content_area = cv2.countNonZero(cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1])
+    if thresh is None:
+        thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    content_area = cv2.countNonZero(thresh)
     total_area = h * w
     density = content_area / total_area
     
@@ -116,39 +329,26 @@ def create_regular_grid(width, height, grid_size):
     return dots
 
 
-def detect_lines_and_curves(img, dots):
+def detect_lines_and_curves(img, dots, analysis=None):
     """Detect lines and curves in the kolam image - FIXED VERSION"""
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    h, w = gray.shape
-    
-    # Preprocess image
-    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    analysis = analysis or KolamAnalysis(img)
+    h, w = analysis.height, analysis.width
     
     lines = []
     curves = []
     
-    # Convert dots to Dot objects for easier handling
-    dot_objects = [Dot(x=float(x), y=float(y)) for x, y in dots]
+    # Build the nearest-dot index once for this image
+    dot_index = DotIndex(dots)
+    dot_objects = dot_index.dots
     
     # Strategy 1: Detect straight lines using HoughLinesP
-    edges = cv2.Canny(thresh, 50, 150)
-    detected_lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=20, minLineLength=30, maxLineGap=15)
-    
-    if detected_lines is not None:
-        for line in detected_lines:
-            x1, y1, x2, y2 = line[0]
-            # Find closest dots to line endpoints
-            start_dot = find_closest_dot(dot_objects, (x1, y1))
-            end_dot = find_closest_dot(dot_objects, (x2, y2))
-            
-            if start_dot != end_dot:  # Avoid self-loops
-                lines.append(LinePath(p1=start_dot, p2=end_dot))
-    
+    detected_lines = cv2.HoughLinesP(analysis.edges, 1, np.pi/180, threshold=20, minLineLength=30, maxLineGap=15)
+    segments = detected_lines.reshape(-1, 4) if detected_lines is not None else np.empty((0, 4))
+    segments = analysis.to_original(segments).reshape(-1, 4)
     
     # Strategy 2: Detect curves using contour analysis (ONLY if red elements exist)
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-    for contour in contours:
+    curve_polys = []
+    for contour in analysis.contours:
         area = cv2.contourArea(contour)
         if area > 100:  # Minimum area threshold
             # Check if contour is curved
@@ -161,18 +361,31 @@ def detect_lines_and_curves(img, dots):
                     approx = cv2.approxPolyDP(contour, epsilon, True)
                     
                     if len(approx) >= 3:
-                        # Create curves from approximated points
-                        for i in range(len(approx) - 2):
-                            p1 = approx[i][0]
-                            ctrl = approx[i + 1][0]
-                            p2 = approx[i + 2][0]
-                            
-                            start_dot = find_closest_dot(dot_objects, (p1[0], p1[1]))
-                            control_dot = Dot(x=float(ctrl[0]), y=float(ctrl[1]))
-                            end_dot = find_closest_dot(dot_objects, (p2[0], p2[1]))
-                            
-                            curves.append(CurvePath(p1=start_dot, ctrl=control_dot, p2=end_dot))
+                        curve_polys.append(analysis.to_original(approx))
+    
+    # Snap every segment endpoint and polygon vertex to its closest dot in one call
+    poly_points = np.vstack(curve_polys) if curve_polys else np.empty((0, 2))
+    snapped = dot_index.snap(np.vstack([segments.reshape(-1, 2), poly_points]))
+    
+    for i in range(len(segments)):
+        start_dot = snapped[2 * i]
+        end_dot = snapped[2 * i + 1]
         
+        if start_dot != end_dot:  # Avoid self-loops
+            lines.append(LinePath(p1=start_dot, p2=end_dot))
+    
+    offset = 2 * len(segments)
+    for approx in curve_polys:
+        # Create curves from approximated points
+        for i in range(len(approx) - 2):
+            ctrl = approx[i + 1]
+            start_dot = snapped[offset + i]
+            control_dot = Dot(x=float(ctrl[0]), y=float(ctrl[1]))
+            end_dot = snapped[offset + i + 2]
+            
+            curves.append(CurvePath(p1=start_dot, ctrl=control_dot, p2=end_dot))
+        offset += len(approx)
+    
     
     # Strategy 3: Pattern-based detection for common kolam structures
     lines.extend(detect_common_patterns(dot_objects, w, h))
@@ -184,6 +397,37 @@ def detect_lines_and_curves(img, dots):
     return lines, curves
 
 
+class DotIndex:
+    """Nearest-dot lookup over the detected dots, built once per image"""
+
+    TIE_NEIGHBOURS = 8
+
+    def __init__(self, dots):
+        self.coords = np.asarray(dots, dtype=float).reshape(-1, 2)
+        self.dots = [Dot(x=float(x), y=float(y)) for x, y in self.coords]
+        self._tree = cKDTree(self.coords) if len(self.coords) else None
+
+    def query(self, points):
+        """Return the index of the closest dot for every (x, y) row in points"""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if self._tree is None or len(points) == 0:
+            return np.empty(0, dtype=int)
+        # Query a few neighbours so equidistant dots resolve to the earliest one, like a linear scan
+        k = min(self.TIE_NEIGHBOURS, len(self.coords))
+        distances, indices = self._tree.query(points, k=k)
+        if k == 1:
+            return indices
+        tied = distances <= distances[:, :1]
+        return np.where(tied, indices, len(self.coords)).min(axis=1)
+
+    def snap(self, points):
+        """Snap every point to its closest dot; returns None for each point if there are no dots"""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if self._tree is None:
+            return [None] * len(points)
+        return [self.dots[i] for i in self.query(points)]
+
+
 def find_closest_dot(dots, point):
     """Find the closest dot to a given point"""
     min_dist = float('inf')
@@ -249,35 +493,45 @@ def detect_common_patterns(dots, width, height):
     return lines
 
 
+CURVE_TOLERANCE = 5
+
+
 def remove_duplicate_lines(lines):
-    """Remove duplicate line paths"""
+    """Remove duplicate line paths (in either direction), keeping the first occurrence"""
     unique_lines = []
+    seen = set()
     for line in lines:
-        is_duplicate = False
-        for existing in unique_lines:
-            if ((line.p1.x == existing.p1.x and line.p1.y == existing.p1.y and
-                 line.p2.x == existing.p2.x and line.p2.y == existing.p2.y) or
-                (line.p1.x == existing.p2.x and line.p1.y == existing.p2.y and
-                 line.p2.x == existing.p1.x and line.p2.y == existing.p1.y)):
-                is_duplicate = True
-                break
-        if not is_duplicate:
+        # Order-independent key so p1->p2 and p2->p1 collide
+        key = tuple(sorted(((line.p1.x, line.p1.y), (line.p2.x, line.p2.y))))
+        if key not in seen:
+            seen.add(key)
             unique_lines.append(line)
     return unique_lines
 
 
-def remove_duplicate_curves(curves):
-    """Remove duplicate curve paths"""
+def remove_duplicate_curves(curves, tolerance=CURVE_TOLERANCE):
+    """Remove curve paths whose points all lie within tolerance of an already kept curve"""
     unique_curves = []
+    # Kept curves bucketed by the grid cell of p1; a near-duplicate can only sit in a neighbouring cell
+    buckets = {}
     for curve in curves:
+        cx = math.floor(curve.p1.x / tolerance)
+        cy = math.floor(curve.p1.y / tolerance)
         is_duplicate = False
-        for existing in unique_curves:
-            if (abs(curve.p1.x - existing.p1.x) < 5 and abs(curve.p1.y - existing.p1.y) < 5 and
-                abs(curve.p2.x - existing.p2.x) < 5 and abs(curve.p2.y - existing.p2.y) < 5 and
-                abs(curve.ctrl.x - existing.ctrl.x) < 5 and abs(curve.ctrl.y - existing.ctrl.y) < 5):
-                is_duplicate = True
+        for nx in (cx - 1, cx, cx + 1):
+            for ny in (cy - 1, cy, cy + 1):
+                for existing in buckets.get((nx, ny), ()):
+                    if (abs(curve.p1.x - existing.p1.x) < tolerance and abs(curve.p1.y - existing.p1.y) < tolerance and
+                        abs(curve.p2.x - existing.p2.x) < tolerance and abs(curve.p2.y - existing.p2.y) < tolerance and
+                        abs(curve.ctrl.x - existing.ctrl.x) < tolerance and abs(curve.ctrl.y - existing.ctrl.y) < tolerance):
+                        is_duplicate = True
+                        break
+                if is_duplicate:
+                    break
+            if is_duplicate:
                 break
         if not is_duplicate:
+            buckets.setdefault((cx, cy), []).append(curve)
             unique_curves.append(curve)
     return unique_curves
 
@@ -389,8 +643,7 @@ def recreate_chalk_kolam_integrated(image_path):
     h, w = image.shape[:2]
 
     # 1. Detection Phase
-    dots_coords = detect_dots_in_image(image)
-    lines, curves = detect_lines_and_curves(image, dots_coords)
+    dots_coords, lines, curves = KolamAnalysis(image).detect()
     dot_objects = [Dot(x=float(x), y=float(y)) for x, y in dots_coords]
 
     # 2. Recreation Phase (Enforced Symmetry)
@@ -1,17 +1,59 @@
+import json
+import os
 import torch
 from torchvision import transforms
+from torchvision.datasets.folder import find_classes
 from PIL import Image
+from typing import Callable, Iterable, Iterator, List, Tuple, Union
 
+from src.api.ingest import open_image
+from src.api.registry import registry
+from src.model.export import ARTIFACTS, load_artifact
 from src.model.model import SimpleCNN
-from src.model.utils import dataset  # so we reuse dataset.classes
 
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
-# Load model
-model = SimpleCNN(num_classes=len(dataset.classes))
-model.load_state_dict(torch.load("src/model/saved/simplecnn.pth", map_location=device))
-model.to(device)
-model.eval()
+MODEL_PATH = "src/model/saved/simplecnn.pth"
+# Written by src/model/train.py next to the weights: {"classes": [...]}
+CLASSES_PATH = os.path.join(os.path.dirname(MODEL_PATH), "classes.json")
+DATA_DIR = "src/model/data"
+
+# "eager" (fp32 PyTorch) or an artifact from src/model/export.py:
+# "int8" (dynamically quantized TorchScript), "torchscript" or "onnx" (onnxruntime)
+CNN_BACKEND = os.environ.get("KOLAM_CNN_BACKEND", "eager")
+
+
+def load_classes() -> List[str]:
+    """Class names in training order, from the manifest saved with the weights."""
+    if os.path.exists(CLASSES_PATH):
+        with open(CLASSES_PATH) as f:
+            return json.load(f)["classes"]
+    # Weights trained before the manifest existed: ImageFolder order is the
+    # sorted class directory names, no need to scan the images themselves
+    print(f"⚠️ {CLASSES_PATH} not found, reading class names from {DATA_DIR}")
+    classes, _ = find_classes(DATA_DIR)
+    return classes
+
+
+def _load_simplecnn() -> Tuple[Callable[[torch.Tensor], torch.Tensor], List[str]]:
+    """The classifier as a callable from an NCHW batch to logits, plus class names."""
+    classes = load_classes()
+    if CNN_BACKEND != "eager":
+        if CNN_BACKEND not in ARTIFACTS:
+            raise ValueError(f"Unknown KOLAM_CNN_BACKEND {CNN_BACKEND!r}, expected eager or one of {list(ARTIFACTS)}")
+        if device != "cpu":
+            raise ValueError(f"KOLAM_CNN_BACKEND={CNN_BACKEND} artifacts are for CPU serving")
+        return load_artifact(CNN_BACKEND, ARTIFACTS[CNN_BACKEND]), classes
+
+    model = SimpleCNN(num_classes=len(classes))
+    model.load_state_dict(torch.load(MODEL_PATH, map_location=device))
+    model.to(device)
+    model.eval()
+    return model, classes
+
+
+# Loaded on first use (or by the startup warm-up)
+registry.register("simplecnn", _load_simplecnn)
 
 # Preprocessing (must match training transforms!)
 transform = transforms.Compose([
@@ -19,10 +61,73 @@ transform = transforms.Compose([
     transforms.ToTensor()
 ])
 
-def predict(image_path: str):
-    image = Image.open(image_path).convert("RGB")
-    tensor = transform(image).unsqueeze(0).to(device)  # add batch dim
+def _to_tensor(image: Union[str, Image.Image]) -> torch.Tensor:
+    if isinstance(image, str):
+        image = Image.open(image)
+    return transform(image.convert("RGB"))
+
+
+def predict_batch(images: List[Union[str, Image.Image]]) -> List[str]:
+    """Classifies several images (paths or PIL images) with one forward pass."""
+    model, classes = registry.get("simplecnn")
+    if not images:
+        return []
+    batch = torch.stack([_to_tensor(image) for image in images]).to(device)
     with torch.no_grad():
-        outputs = model(tensor)
+        outputs = model(batch)
         _, predicted = torch.max(outputs, 1)
-    return dataset.classes[predicted.item()]
+    return [classes[i] for i in predicted.tolist()]
+
+
+def predict(image: Union[str, Image.Image]):
+    """Classifies an image given as a path or an already-opened PIL image."""
+    return predict_batch([image])[0]
+
+
+def predict_top_k(images: List[Union[str, Image.Image]], k: int = 3) -> List[List[dict]]:
+    """
+    Classifies several images with one forward pass and returns, per image,
+    the k most likely classes as [{"label", "probability"}] (softmax, best first).
+    """
+    model, classes = registry.get("simplecnn")
+    if not images:
+        return []
+    k = max(1, min(k, len(classes)))
+    batch = torch.stack([_to_tensor(image) for image in images]).to(device)
+    with torch.no_grad():
+        probabilities = torch.softmax(model(batch), dim=1)
+        top_p, top_i = probabilities.topk(k, dim=1)
+    return [
+        [{"label": classes[i], "probability": round(p, 6)} for p, i in zip(ps, idx)]
+        for ps, idx in zip(top_p.tolist(), top_i.tolist())
+    ]
+
+
+def classify_images(named_images: Iterable[Tuple[str, bytes]], k: int = 3, batch_size: int = 32) -> Iterator[dict]:
+    """
+    Classifies a stream of (name, image bytes) pairs batch_size at a time and
+    yields one {"name", "predictions"} result per image, in input order.
+    Images that can't be decoded yield {"name", "error"} instead.
+    """
+    pending = []  # (name, image or None, error) in input order
+    count = 0
+
+    def flush():
+        predictions = iter(predict_top_k([image for _, image, _ in pending if image is not None], k))
+        for name, image, error in pending:
+            if image is None:
+                yield {"name": name, "error": error}
+            else:
+                yield {"name": name, "predictions": next(predictions)}
+        pending.clear()
+
+    for name, data in named_images:
+        try:
+            pending.append((name, open_image(data), None))
+            count += 1
+        except ValueError as e:
+            pending.append((name, None, str(e)))
+        if count >= batch_size:
+            yield from flush()
+            count = 0
+    yield from flush()
@@ -0,0 +1,88 @@
+# src/api/ingest.py
+"""
+Upload ingest: decode request bytes straight into images, without temp files.
+
+`decode_image` gives the OpenCV pipelines a BGR array decoded from a
+zero-copy NumPy view over the upload bytes; `open_image` gives the
+PIL-based models (SimpleCNN, CLIP) an image read from an in-memory buffer.
+`content_hash` is the key caches use to recognise a repeated upload, and
+`iter_archive_images` reads the images out of an uploaded zip.
+"""
+import hashlib
+import zipfile
+from io import BytesIO
+from typing import Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+
+def decode_image(data: bytes) -> Optional[np.ndarray]:
+    """Decodes upload bytes into a BGR image. Returns None if they aren't an image."""
+    if not data:
+        return None
+    buffer = np.frombuffer(data, dtype=np.uint8)  # view over the bytes, no copy
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def open_image(data: bytes) -> Image.Image:
+    """Opens upload bytes as an RGB PIL image. Raises ValueError if they aren't an image."""
+    try:
+        image = Image.open(BytesIO(data))
+        return image.convert("RGB")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Could not load image: {e}")
+
+
+def content_hash(data: bytes) -> str:
+    """Stable content address for an upload (hex SHA-256)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+class ArchiveTooLarge(ValueError):
+    """A zip upload over the image-count or per-image size limit."""
+
+
+def iter_archive_images(
+    data: bytes,
+    max_images: Optional[int] = None,
+    max_image_bytes: Optional[int] = None,
+) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yields (name, bytes) for each image file in a zip upload, one at a time.
+    The archive is checked before anything is read: raises ValueError if the
+    upload isn't a zip, and ArchiveTooLarge if it holds more than max_images
+    images or one that unpacks to more than max_image_bytes (so a zip bomb
+    is rejected from its directory, without being expanded).
+    """
+    try:
+        archive = zipfile.ZipFile(BytesIO(data))
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Could not read archive: {e}")
+
+    entries = [
+        info for info in archive.infolist()
+        if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+        and not info.filename.startswith("__MACOSX/")
+    ]
+    if max_images is not None and len(entries) > max_images:
+        archive.close()
+        raise ArchiveTooLarge(f"Archive holds {len(entries)} images, at most {max_images} allowed")
+    for info in entries:
+        if max_image_bytes is not None and info.file_size > max_image_bytes:
+            archive.close()
+            raise ArchiveTooLarge(
+                f"{info.filename} unpacks to {info.file_size} bytes, at most {max_image_bytes} allowed"
+            )
+
+    def read():
+        # Reads stop at the declared file_size, so the check above bounds memory
+        with archive:
+            for info in entries:
+                yield info.filename, archive.read(info)
+
+    return read()
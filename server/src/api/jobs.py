@@ -0,0 +1,151 @@
+# src/api/jobs.py
+"""
+CPU-bound pipelines that the worker pool runs off the event loop.
+
+Every job is a top-level function that takes and returns plain picklable
+values (upload bytes, numbers, dicts), so it can run in a separate process.
+Uploads are decoded in the worker, once per job.
+"""
+import random
+from typing import List, Optional, Tuple
+
+from src.api.img_processing import KolamAnalysis
+from src.api.ingest import decode_image
+from src.api.raster import encode, kolam_geometry, rasterize
+from src.api.recreate_logic import KolamRecreator
+from src.api.render import render_kolam
+from src.api.schemas import KolamRequest, Dot, LinePath, CurvePath
+
+
+def kolam_to_json(dots, paths) -> dict:
+    """Formats detected dots and paths as a KolamRequest-shaped dict."""
+    result = {
+        "dots": [{"x": float(x), "y": float(y)} for x, y in dots],
+        "paths": []
+    }
+
+    for path in paths:
+        if isinstance(path, LinePath):
+            result["paths"].append({
+                "type": "line",
+                "p1": {"x": path.p1.x, "y": path.p1.y},
+                "p2": {"x": path.p2.x, "y": path.p2.y}
+            })
+        elif isinstance(path, CurvePath):
+            result["paths"].append({
+                "type": "curve",
+                "p1": {"x": path.p1.x, "y": path.p1.y},
+                "ctrl": {"x": path.ctrl.x, "y": path.ctrl.y},
+                "p2": {"x": path.p2.x, "y": path.p2.y}
+            })
+
+    return result
+
+
+def analyze_kolam(image_bytes: bytes, max_pixels: Optional[int] = None, refine: bool = False) -> Optional[dict]:
+    """
+    Detects dots, lines and curves in the uploaded image.
+    Returns KolamRequest-shaped JSON plus an "analysis" report, or None if
+    the image could not be decoded.
+    """
+    img = decode_image(image_bytes)
+    if img is None:
+        return None
+
+    analysis = KolamAnalysis(img, max_pixels=max_pixels, refine=refine)
+    dots, lines, curves = analysis.detect()
+
+    result = kolam_to_json(dots, [*lines, *curves])
+    result["analysis"] = analysis.report()
+    return result
+
+
+def render_kolam_request(kolam_json: dict) -> str:
+    """Validates KolamRequest-shaped JSON and renders it; returns the SVG filename."""
+    kolam = KolamRequest(**kolam_json)
+    return render_kolam(
+        [(dot.x, dot.y) for dot in kolam.dots],
+        kolam.paths
+    )
+
+
+def render_kolam_raster(kolam_json: dict, size: int, fmt: str) -> bytes:
+    """Validates KolamRequest-shaped JSON and draws it as a size x size PNG/WebP."""
+    kolam = KolamRequest(**kolam_json)
+    lines, curves = kolam_geometry(kolam.paths)
+    dots = [(dot.x, dot.y) for dot in kolam.dots]
+    return encode(rasterize(dots, lines, curves, size), fmt)
+
+
+def recreate_kolam_image(
+    image_bytes: bytes,
+    max_pixels: Optional[int] = None,
+    refine: bool = False,
+    detected_dots: Optional[List[Tuple[float, float]]] = None,
+    seed: Optional[int] = None,
+) -> Tuple[str, List[Tuple[float, float]], dict]:
+    """
+    Runs dot detection (unless detected_dots are passed in from a previous
+    run) and uses the KolamRecreator to generate a symmetric, clean SVG.
+    Falls back to a random rangoli if recreation fails. With a seed, both
+    are deterministic: the same image and seed give the same file.
+    Returns the rendered SVG filename, the dots it was built from and the
+    recreator's path counts (empty for the fallback).
+    """
+    img = decode_image(image_bytes)
+    if img is None:
+        raise Exception("Could not load image for recreation")
+
+    # Dimensions for scaling come from the image decoded above: the recreator
+    # never re-reads it or re-runs CLAHE
+    source = img
+    if detected_dots is None:
+        # --- ENHANCEMENT FOR DOT DETECTION: Applying contrast equalization ---
+        # Dots are detected on the CLAHE-enhanced grayscale to handle uneven lighting/faint dots
+        analysis = KolamAnalysis(img, max_pixels=max_pixels, refine=refine)
+        detected_dots = analysis.detect_dots(enhanced=True)
+        source = analysis
+        # --------------------------------------------------------------------
+    detected_dots = [(x, y) for x, y in detected_dots]
+
+    # --- ATTEMPT COMPLEX RECREATION ---
+    try:
+        recreator = KolamRecreator(seed=seed)
+        # detected_dots is List[Tuple[float, float]]
+        # Pass the decoded image (or its analysis); the recreation logic only needs its geometry
+        recreated = recreator.recreate(detected_dots, source)
+        return recreated, detected_dots, recreator.last_stats
+
+    except Exception as e:
+        # --- FALLBACK: Generate Random Rangoli ---
+        print(f"Kolam recreation failed ({str(e)}). Falling back to random rendering.")
+
+        if not detected_dots:
+            raise Exception("Kolam recreation failed and no dots were detected for fallback.")
+
+        num_dots_to_connect = min(15, len(detected_dots))
+
+        # Select dots to be part of the random pattern
+        active_dots = random.Random(seed).sample(detected_dots, num_dots_to_connect)
+        random_paths = []
+
+        if len(active_dots) >= 2:
+            # Loop through the dots and create LinePaths between them
+            for i in range(len(active_dots)):
+                p1_tuple = active_dots[i]
+                p2_tuple = active_dots[(i + 1) % len(active_dots)]
+
+                # Create Dot objects for LinePath
+                p1 = Dot(x=p1_tuple[0], y=p1_tuple[1])
+                p2 = Dot(x=p2_tuple[0], y=p2_tuple[1])
+
+                # NOTE: Using LinePath for the simple random fallback
+                line_path = LinePath(p1=p1, p2=p2)
+                random_paths.append(line_path)
+
+        # Use the original list of tuples (detected_dots) for rendering
+        fallback_filename = render_kolam(
+            detected_dots,
+            random_paths
+        )
+        return fallback_filename, detected_dots, {}
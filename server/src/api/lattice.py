@@ -0,0 +1,152 @@
+# src/api/lattice.py
+"""
+Dot-grid inference for kolam recreation.
+
+Kolam dots sit on a (possibly rotated, possibly rectangular) lattice.
+`Lattice.fit` estimates its orientation and pitch once from nearest-neighbour
+offsets, gives every dot integer (row, col) coordinates, and then answers
+"which dot is next to this one along each lattice axis" with a dict lookup
+instead of a scan over all dots.
+"""
+import math
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# A dot counts as on the lattice when it is within this fraction of a pitch of its node
+NODE_TOLERANCE = 0.3
+# Fit is rejected (callers fall back to pairwise search) below this on-lattice fraction
+MIN_ON_LATTICE = 0.8
+NEIGHBOURS_PER_DOT = 4
+
+
+class Lattice:
+    """A fitted dot lattice: orientation, pitch and (row, col) of every on-lattice dot."""
+
+    def __init__(self, points: np.ndarray, angle: float, pitch: Tuple[float, float],
+                 cells: Dict[Tuple[int, int], int], coords: np.ndarray, on_lattice: np.ndarray):
+        self.points = points
+        self.angle = angle  # radians, in [-pi/4, pi/4): the column axis closest to horizontal
+        self.pitch = pitch  # (along columns, along rows)
+        self.cells = cells  # (row, col) -> dot index
+        self.coords = coords  # N x 2 integer (row, col)
+        self.on_lattice = on_lattice  # N bools
+        rows = [cell[0] for cell in cells] or [0]
+        cols = [cell[1] for cell in cells] or [0]
+        self.bounds = (min(rows), max(rows), min(cols), max(cols))  # occupied (row, col) range
+
+    @classmethod
+    def fit(cls, points: np.ndarray) -> Optional["Lattice"]:
+        """Fits a lattice to N x 2 dot coordinates; None if they don't form a clean grid."""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        n = len(points)
+        if n < 4:
+            return None
+
+        k = min(NEIGHBOURS_PER_DOT, n - 1)
+        distances, indices = cKDTree(points).query(points, k=k + 1)
+        distances, indices = distances[:, 1:], indices[:, 1:]
+        nearest = np.median(distances[:, 0])
+        if nearest <= 0:
+            return None
+
+        # Keep offsets to direct neighbours only (diagonals are ~1.41x further)
+        keep = distances < 1.25 * nearest
+        offsets = (points[indices] - points[:, None, :])[keep]
+        if len(offsets) < 2:
+            return None
+
+        # Orientation: lattice directions repeat every 90 degrees, so average 4*theta
+        theta = np.arctan2(offsets[:, 1], offsets[:, 0])
+        angle = float(np.angle(np.exp(4j * theta).mean()) / 4)
+
+        cos, sin = math.cos(angle), math.sin(angle)
+        rotation = np.array([[cos, sin], [-sin, cos]])  # canvas -> lattice axes
+        local = offsets @ rotation.T
+        along_u = np.abs(local[:, 0]) >= np.abs(local[:, 1])
+        pitch = np.array([
+            np.abs(local[along_u, 0]).mean() if along_u.any() else nearest,
+            np.abs(local[~along_u, 1]).mean() if (~along_u).any() else nearest,
+        ])
+
+        # Origin: where the nodes sit, as a circular mean of the fractional positions
+        positions = points @ rotation.T
+        origin = np.angle(np.exp(2j * np.pi * positions / pitch).mean(axis=0)) / (2 * np.pi) * pitch
+        for refit in (True, True, False):
+            grid = (positions - origin) / pitch
+            nodes = np.round(grid)
+            residual = np.abs(grid - nodes).max(axis=1)
+            on_lattice = residual <= NODE_TOLERANCE
+            if on_lattice.mean() < MIN_ON_LATTICE:
+                return None
+            if not refit:
+                break
+            # Least-squares refit of pitch and origin on the on-lattice dots, so
+            # small pitch errors don't add up across a wide grid
+            for axis in (0, 1):
+                steps = nodes[on_lattice, axis]
+                if np.ptp(steps) >= 1:
+                    pitch[axis], origin[axis] = np.polyfit(steps, positions[on_lattice, axis], 1)
+            if (pitch <= 0).any():
+                return None
+
+        coords = nodes[:, ::-1].astype(int)  # (row, col)
+        cells: Dict[Tuple[int, int], int] = {}
+        # Closest dot to each node wins the cell; the rest are treated as off-lattice
+        for i in np.argsort(residual, kind="stable"):
+            if not on_lattice[i]:
+                break
+            cell = (int(coords[i, 0]), int(coords[i, 1]))
+            if cell in cells:
+                on_lattice[i] = False
+            else:
+                cells[cell] = int(i)
+
+        return cls(points, angle, (float(pitch[0]), float(pitch[1])), cells, coords, on_lattice)
+
+    def neighbours(self, index: int, max_distance: float = math.inf) -> Optional[Dict[str, int]]:
+        """
+        Indices of the nearest lattice neighbour along the column axis
+        ("x_neighbor") and the row axis ("y_neighbor") of dot `index`, closer
+        than max_distance. None if the dot isn't on the lattice.
+
+        Empty cells are skipped, so a dot the detector missed is bridged to
+        the next one along the axis, as the pairwise scan does.
+        """
+        if not self.on_lattice[index]:
+            return None
+        row, col = self.coords[index]
+        result = {}
+        for key, (d_row, d_col), pitch in (
+            ("x_neighbor", (0, 1), self.pitch[0]),
+            ("y_neighbor", (1, 0), self.pitch[1]),
+        ):
+            best = None
+            for sign in (-1, 1):
+                other = self._walk(row, col, sign * d_row, sign * d_col, pitch, max_distance)
+                if other is None:
+                    continue
+                distance = float(np.hypot(*(self.points[other] - self.points[index])))
+                # Equal distances go to the dot listed first, like a linear scan would
+                if distance < max_distance and (best is None or (distance, other) < best):
+                    best = (distance, other)
+            if best is not None:
+                result[key] = best[1]
+        return result
+
+    def _walk(self, row: int, col: int, d_row: int, d_col: int, pitch: float, max_distance: float) -> Optional[int]:
+        """First dot from (row, col) in steps of (d_row, d_col) that could be within max_distance."""
+        min_row, max_row, min_col, max_col = self.bounds
+        # Dots sit within NODE_TOLERANCE pitches of their node, so k steps are at least this far
+        slack = 2 * NODE_TOLERANCE
+        step = 1
+        while (step - slack) * pitch < max_distance:
+            cell = (row + step * d_row, col + step * d_col)
+            if not (min_row <= cell[0] <= max_row and min_col <= cell[1] <= max_col):
+                return None
+            other = self.cells.get(cell)
+            if other is not None:
+                return other
+            step += 1
+        return None
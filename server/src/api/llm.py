@@ -1,23 +1,24 @@
 import json
 import os
-import uuid
 import base64
 from google import genai
 from dotenv import load_dotenv
 import requests
 import re
 
+from src.api.registry import registry
 from src.api.schemas import KolamRequest
+from src.api.storage import IMG_DIR, store_bytes
 
 load_dotenv()
 google_api_key = os.environ.get("GOOGLE_API_KEY")
-client = genai.Client(api_key=google_api_key)
+# Created on first use, so a missing key only fails the LLM endpoints
+registry.register("genai", lambda: genai.Client(api_key=google_api_key))
 
-IMG_DIR = "img"
 os.makedirs(IMG_DIR, exist_ok=True)
 
 def llm_image(image_b64: str, mime_type: str = "image/png") -> str:
-    response = client.models.generate_content(
+    response = registry.get("genai").models.generate_content(
         model="gemini-2.5-flash",
         contents=[
             {"text": "Make a better, more aesthetic rangoli (kolam) design from this image."},
@@ -35,16 +36,14 @@ def llm_image(image_b64: str, mime_type: str = "image/png") -> str:
     if not image_base64:
         raise ValueError("No image could be generated")
 
-    output_filename = f"{uuid.uuid4()}.png"
-    output_path = os.path.join(IMG_DIR, output_filename)
-    with open(output_path, "wb") as f:
-        f.write(base64.b64decode(image_base64))
+    # Content-addressed, so the same image is stored once
+    return store_bytes(base64.b64decode(image_base64), IMG_DIR, ".png")
 
-    return output_filename
-
-STABILITY_KEY = os.environ["STABILITY_API_KEY"]
+STABILITY_KEY = os.environ.get("STABILITY_API_KEY")
 
 def sd_image(image_b64: str, prompt: str) -> str:
+    if not STABILITY_KEY:
+        raise ValueError("STABILITY_API_KEY is not set")
     response = requests.post(
         "https://api.stability.ai/v2beta/stable-image/generate/core",
         headers={
@@ -72,17 +71,11 @@ def sd_image(image_b64: str, prompt: str) -> str:
         raise ValueError("No image generated")
 
     img_b64 = artifacts[0]["base64"]
-    filename = f"{uuid.uuid4()}.png"
-    output_path = os.path.join(IMG_DIR, filename)
-
-    with open(output_path, "wb") as f:
-        f.write(base64.b64decode(img_b64))
-
-    return filename
+    return store_bytes(base64.b64decode(img_b64), IMG_DIR, ".png")
 
 def llm_prompt(prompt: str, model_name: str = "gemini-2.5-flash") -> str:
     try:
-        response = client.models.generate_content(
+        response = registry.get("genai").models.generate_content(
             model=model_name, contents=prompt
         )
         return response.text.strip() if hasattr(response, "text") else str(response)
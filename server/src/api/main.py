@@ -1,27 +1,33 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from src.api.auth import router as auth_router
 import uvicorn
-import cv2
 import os
-import shutil
-import uuid
 import numpy as np
 import base64
-import random 
-from src.api.recreate_logic import KolamRecreator 
-from src.api.inference import predict
-from src.api.render import render_kolam, reconstruct_paths
+import hashlib
+import json
+import re
+from src.api.inference import classify_images, predict_batch
+from src.api.batching import PREDICT_MAX_BATCH, PREDICT_MAX_QUEUE, PREDICT_MAX_WAIT_MS, MicroBatcher
+from src.api.render import iter_svg, reconstruct_paths
 from src.api.schemas import KolamRequest, Dot, LinePath, CurvePath
-from src.api.img_processing import detect_dots_in_image, detect_lines_and_curves
-from src.api.vector import find_similar
+from src.api.cache import CACHE_DIR, FileCache, make_cache
+from src.api.img_processing import DETECTOR_VERSION
+from src.api.ingest import ArchiveTooLarge, content_hash, iter_archive_images, open_image
+from src.api.jobs import analyze_kolam, render_kolam_raster, render_kolam_request, recreate_kolam_image
+from src.api.raster import MEDIA_TYPES, RASTER_FORMATS, thumbnail
+from src.api.recreate_logic import RECREATOR_VERSION
+from src.api.workers import worker_pool
+from src.api.registry import WARMUP_MODELS, registry
+from src.api.storage import storage
+from src.api.vector import embedding_cache, find_similar
 from src.api.llm import llm_image, llm_prompt_for_kolam
 from src.api.llm import sd_image
-from typing import Union
-import tempfile
-import hashlib
+from typing import List, Optional, Union
 
 app = FastAPI(title="Kolam AI server", version="0.1.0")
 
@@ -40,8 +46,69 @@ app.mount("/imgdata", StaticFiles(directory="imgdata"), name="imgdata")
 
 app.include_router(auth_router, prefix="/api/auth")
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+@app.on_event("startup")
+def warm_up_models():
+    # Load models in the background so the server accepts requests right away
+    registry.warm_up(WARMUP_MODELS)
+
+
+@app.on_event("startup")
+async def start_storage_sweeper():
+    storage.start()
+
+
+@app.on_event("shutdown")
+def shutdown_worker_pool():
+    worker_pool.shutdown()
+    predict_batcher.stop()
+    storage.stop()
+
+
+@app.get("/api/health")
+def health():
+    """Liveness plus per-model load state; always 200 while the server is up."""
+    return {
+        "status": "ok",
+        "ready": registry.ready(WARMUP_MODELS),
+        "models": registry.status(),
+        "workers": worker_pool.status(),
+    }
+
+
+@app.get("/api/health/ready")
+def readiness():
+    """200 once the warm-up models are loaded, 503 until then."""
+    if not registry.ready(WARMUP_MODELS):
+        return JSONResponse(status_code=503, content={"ready": False, "models": registry.status()})
+    return {"ready": True}
+
+
+# Default pixel budget for dot/path detection; large uploads are downscaled to it.
+# 0 keeps full resolution. Each request can override it with ?max_pixels=
+DETECTION_MAX_PIXELS = int(os.environ.get("KOLAM_MAX_PIXELS", "0"))
+# Smallest budget a request may ask for: below it dots shrink to a pixel or two
+# and detection returns noise
+MIN_DETECTION_PIXELS = 256 * 256
+
+
+def detection_pixels(max_pixels: Optional[int]) -> int:
+    """The request's pixel budget (server default if not given), or 422 if it's too small."""
+    if max_pixels is None:
+        return DETECTION_MAX_PIXELS
+    if 0 < max_pixels < MIN_DETECTION_PIXELS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"max_pixels must be 0 (full resolution) or at least {MIN_DETECTION_PIXELS}",
+        )
+    return max_pixels
+
+def read_upload_image(content: bytes):
+    """Opens upload bytes as a PIL image, or responds 400 if they aren't an image."""
+    try:
+        return open_image(content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # -----------------------------------------------------------
 # Placeholder for Mathematical Metric Calculation
@@ -77,125 +144,193 @@ def calculate_kolam_metrics(dots: list[Dot], paths: list[Union[LinePath, CurvePa
 # -----------------------------------------------------------
 
 
+# Bounds for rendered raster sizes (pixels per side)
+MIN_RASTER_SIZE, MAX_RASTER_SIZE = 16, 2048
+
+def check_raster_args(fmt: str, size: int) -> None:
+    if fmt not in RASTER_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(RASTER_FORMATS)}")
+    if not MIN_RASTER_SIZE <= size <= MAX_RASTER_SIZE:
+        raise HTTPException(status_code=400, detail=f"size must be between {MIN_RASTER_SIZE} and {MAX_RASTER_SIZE}")
+
+
 @app.post("/api/create_kolam")
-def create_kolam(data: KolamRequest):
-    filename = render_kolam(
-        [(dot.x, dot.y) for dot in data.dots],
-        data.paths
-    )
+async def create_kolam(
+    data: KolamRequest,
+    inline: bool = False,
+    fmt: str = Query("svg", alias="format"),
+    size: int = 512,
+):
+    if fmt != "svg":
+        # PNG/WebP drawn server-side, for clients that can't handle large SVGs
+        check_raster_args(fmt, size)
+        image = await worker_pool.run(render_kolam_raster, data.model_dump(), size, fmt)
+        return Response(image, media_type=MEDIA_TYPES[fmt])
+
+    if inline:
+        # Stream the SVG back instead of storing it under img/
+        dots = [(dot.x, dot.y) for dot in data.dots]
+        return StreamingResponse(iter_svg(dots, data.paths), media_type="image/svg+xml")
+
+    filename = await worker_pool.run(render_kolam_request, data.model_dump())
     return {"message": "Kolam created", "file": filename}
 
 
+@app.get("/api/workers")
+def worker_status():
+    return worker_pool.status()
+
+
+@app.get("/api/storage")
+def storage_status():
+    """Limits and file/byte counts per managed directory, as of the last sweep."""
+    return storage.status()
+
+
+# Encoded thumbnails of img/ files, keyed by their ETag
+thumbnail_cache = FileCache(
+    os.path.join(CACHE_DIR, "thumbnails"),
+    max_bytes=int(os.environ.get("KOLAM_THUMBNAIL_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+)
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{32}(_kolam\.svg|\.png)$")
+
+
+@app.get("/api/thumbnail/{filename:path}")
+async def kolam_thumbnail(
+    filename: str,
+    request: Request,
+    size: int = 256,
+    fmt: str = Query("webp", alias="format"),
+):
+    """PNG/WebP thumbnail of a rendered or generated image in img/ (e.g. ?size=128&format=webp)."""
+    check_raster_args(fmt, size)
+    name = os.path.basename(filename)
+    path = os.path.join("img", name)
+    if filename not in (name, f"img/{name}") or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # Content-addressed files never change; anything else is versioned by size + mtime
+    immutable = CONTENT_ADDRESSED.match(name) is not None
+    if immutable:
+        version = f"{name}:{size}:{fmt}"
+    else:
+        stat = os.stat(path)
+        version = f"{name}:{stat.st_size}:{stat.st_mtime_ns}:{size}:{fmt}"
+    etag = '"' + hashlib.sha256(version.encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable" if immutable else "public, max-age=86400",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    image = thumbnail_cache.get(etag)
+    if image is None:
+        try:
+            image = await worker_pool.run(thumbnail, path, size, fmt)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        thumbnail_cache.set(etag, image)
+    return Response(image, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+# Detection output keyed by upload hash + detector settings, shared by
+# /api/know-your-kolam, /api/know-and-create-kolam and /api/recreate
+detection_cache = make_cache("detections")
+
+
+def detection_key(stage: str, image_hash: str, max_pixels: int, refine: bool) -> str:
+    # The detector version keeps results from before an upgrade from being served
+    return f"{stage}:v{DETECTOR_VERSION}:{image_hash}:{max_pixels}:{refine}"
+
+
+async def detect_kolam(content: bytes, image_hash: str, max_pixels: int, refine: bool) -> Optional[dict]:
+    """Dots + paths (KolamRequest-shaped, with an "analysis" report) for an upload, memoized."""
+    key = detection_key("kolam", image_hash, max_pixels, refine)
+    result = detection_cache.get(key)
+    if result is not None:
+        result["analysis"]["memoized"] = True
+        return result
+
+    result = await worker_pool.run(analyze_kolam, content, max_pixels, refine)
+    if result is not None:
+        detection_cache.set(key, result)
+    return result
+
+
 @app.post("/api/know-your-kolam")
-async def know_your_kolam(file: UploadFile = File(...)):
-    # Save uploaded file
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-    tmp.write(await file.read())
-    tmp.close()
+async def know_your_kolam(
+    file: UploadFile = File(...),
+    max_pixels: Optional[int] = Query(None, ge=0),
+    refine: bool = False,
+):
+    max_pixels = detection_pixels(max_pixels)
+    # Uploads are decoded from memory, nothing is written to disk
+    content = await file.read()
     
     try:
-        # Load and process image
-        img = cv2.imread(tmp.name, cv2.IMREAD_COLOR)
-        if img is None:
+        # Detect dots, then lines and curves, in a worker process (or reuse an earlier run).
+        # The result matches the KolamRequest schema (plus an "analysis" report)
+        result = await detect_kolam(
+            content,
+            content_hash(content),
+            max_pixels,
+            refine,
+        )
+        if result is None:
             return {"error": "Could not load image"}
         
-        h, w = img.shape[:2]
-        
-        # Step 1: Detect dots in the image
-        detected_dots = detect_dots_in_image(img)
-        
-        # Convert to Dot objects
-        dots = [Dot(x=float(x), y=float(y)) for x, y in detected_dots]
-        
-        # Step 2: Detect lines and curves
-        lines, curves = detect_lines_and_curves(img, detected_dots)
-        
-        # Combine all paths
-        all_paths = []
-        for line in lines:
-            all_paths.append(line)
-        for curve in curves:
-            all_paths.append(curve)
-        
-        # Step 3: Return formatted response that matches KolamRequest schema
-        result = {
-            "dots": [{"x": dot.x, "y": dot.y} for dot in dots],
-            "paths": []
-        }
-        
-        # Format paths according to schema
-        for path in all_paths:
-            if isinstance(path, LinePath):
-                result["paths"].append({
-                    "type": "line",
-                    "p1": {"x": path.p1.x, "y": path.p1.y},
-                    "p2": {"x": path.p2.x, "y": path.p2.y}
-                })
-            elif isinstance(path, CurvePath):
-                result["paths"].append({
-                    "type": "curve",
-                    "p1": {"x": path.p1.x, "y": path.p1.y},
-                    "ctrl": {"x": path.ctrl.x, "y": path.ctrl.y},
-                    "p2": {"x": path.p2.x, "y": path.p2.y}
-                })
-        
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         return {"error": f"Error processing image: {str(e)}"}
 
-cache = {}
+# Results keyed by upload hash + detection settings; bounded and shared across workers
+result_cache = make_cache("know_and_create")
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    return {
+        "know_and_create": result_cache.stats(),
+        "detections": detection_cache.stats(),
+        "recreations": recreate_cache.stats(),
+        "query_embeddings": embedding_cache.stats(),
+        "thumbnails": thumbnail_cache.stats(),
+    }
 
 @app.post("/api/know-and-create-kolam")
-async def know_and_create_kolam(file: UploadFile = File(...)):
+async def know_and_create_kolam(
+    file: UploadFile = File(...),
+    max_pixels: Optional[int] = Query(None, ge=0),
+    refine: bool = False,
+):
     # Read file content
     content = await file.read()
     
-    # Compute hash of file content
-    file_hash = hashlib.md5(content).hexdigest()
+    max_pixels = detection_pixels(max_pixels)
+    
+    # Compute hash of file content (detection settings change the result too)
+    image_hash = content_hash(content)
+    file_hash = detection_key("know-and-create", image_hash, max_pixels, refine)
     
-    # Check if this file content is already cached
-    if file_hash in cache:
-        return cache[file_hash]
+    # Check if this file content is already cached (and the sweeper hasn't removed its image since)
+    cached = result_cache.get(file_hash)
+    if cached is not None:
+        if os.path.isfile(cached["image_url"]):
+            return cached
+        result_cache.delete(file_hash)
 
     try:
-        # Save to temporary file (needed for OpenCV)
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-        tmp.write(content)
-        tmp.close()
-
-        # Step 1: Load image
-        img = cv2.imread(tmp.name, cv2.IMREAD_COLOR)
-        if img is None:
+        # Step 1 & 2: Decode image, detect dots + paths
+        kolam_json = await detect_kolam(content, image_hash, max_pixels, refine)
+        if kolam_json is None:
             return {"error": "Could not load image"}
+        analysis_report = kolam_json.pop("analysis")
 
-        # Step 2: Detect dots + paths
-        detected_dots = detect_dots_in_image(img)
-        dots = [Dot(x=float(x), y=float(y)) for x, y in detected_dots]
-        lines, curves = detect_lines_and_curves(img, detected_dots)
-
-        kolam_json = {
-            "dots": [{"x": d.x, "y": d.y} for d in dots],
-            "paths": []
-        }
-
-        for path in [*lines, *curves]:
-            if isinstance(path, LinePath):
-                kolam_json["paths"].append({
-                    "type": "line",
-                    "p1": {"x": path.p1.x, "y": path.p1.y},
-                    "p2": {"x": path.p2.x, "y": path.p2.y}
-                })
-            elif isinstance(path, CurvePath):
-                kolam_json["paths"].append({
-                    "type": "curve",
-                    "p1": {"x": path.p1.x, "y": path.p1.y},
-                    "ctrl": {"x": path.ctrl.x, "y": path.ctrl.y},
-                    "p2": {"x": path.p2.x, "y": path.p2.y}
-                })
-
-        # Step 3: Improve with LLM
-        improved_json = llm_prompt_for_kolam(kolam_json)
+        # Step 3: Improve with LLM (network-bound, so a thread is enough)
+        improved_json = await run_in_threadpool(llm_prompt_for_kolam, kolam_json)
 
         # Step 4: Validate
         try:
@@ -205,23 +340,25 @@ async def know_and_create_kolam(file: UploadFile = File(...)):
             validated = KolamRequest(**kolam_json)
 
         # Step 5: Render final enhanced kolam
-        output_filename = render_kolam(
-            [(dot.x, dot.y) for dot in validated.dots],
-            validated.paths
-        )
+        output_filename = await worker_pool.run(render_kolam_request, validated.model_dump())
 
         # Step 6: Calculate metrics
         metrics = calculate_kolam_metrics(validated.dots, validated.paths)
 
-        # Cache the result keyed by file hash
-        cache[file_hash] = {
+        result = {
             "message": "Kolam analyzed, enhanced by LLM, and created successfully",
             "image_url": output_filename,
             "metrics": metrics,
+            "analysis": analysis_report,
         }
 
-        return cache[file_hash]
+        # Cache the result keyed by file hash
+        result_cache.set(file_hash, result)
+
+        return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         return {"error": f"Error processing image: {str(e)}"}
 
@@ -229,102 +366,143 @@ async def know_and_create_kolam(file: UploadFile = File(...)):
 # -----------------------------------------------------------
 # FIXED ROUTE: /api/recreate endpoint using KolamRecreator
 # -----------------------------------------------------------
+# Recreations keyed by upload hash + detection settings + seed. With a seed the
+# output is a pure function of the input, so a repeat upload reuses the stored SVG
+recreate_cache = make_cache("recreations")
+
+
 @app.post("/api/recreate")
-async def recreate_kolam(file: UploadFile = File(...)):
+async def recreate_kolam(
+    request: Request,
+    file: UploadFile = File(...),
+    max_pixels: Optional[int] = Query(None, ge=0),
+    refine: bool = False,
+    seed: Optional[int] = None,
+):
     """
     Accepts an uploaded image, runs dot detection, and uses the 
     KolamRecreator to generate a symmetric, clean SVG. Includes a random 
     fallback if the complex recreation logic fails.
+
+    The loop shapes are drawn from ?seed= (default: derived from the image
+    content), so identical uploads give identical output, tagged with an ETag.
     """
-    
-    file_id = uuid.uuid4()
-    file_path = os.path.join(UPLOAD_DIR, f"original_{file_id}_{file.filename}")
+    content = await file.read()
+    max_pixels = detection_pixels(max_pixels)
+    image_hash = content_hash(content)
+    if seed is None:
+        seed = int(image_hash[:12], 16)  # 48 bits: exact as a JSON/JavaScript number
+
+    key = f"{detection_key('recreate', image_hash, max_pixels, refine)}:r{RECREATOR_VERSION}:{seed}"
+    headers = {"ETag": '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'}
+
+    # The sweeper may have removed the stored file since; recreate it then,
+    # and only answer 304 while the URL the client holds still resolves
+    cached = recreate_cache.get(key)
+    if cached is not None:
+        if os.path.isfile(cached["recreatedImage"]):
+            if headers["ETag"] in request.headers.get("if-none-match", ""):
+                return Response(status_code=304, headers=headers)
+            return JSONResponse(cached, headers=headers)
+        recreate_cache.delete(key)
     
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        img = cv2.imread(file_path, cv2.IMREAD_COLOR)
-        if img is None:
-            raise Exception("Could not load image for recreation")
-
-        # --- ENHANCEMENT FOR DOT DETECTION: Applying contrast equalization ---
-        # Convert to grayscale for robust processing
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        # Apply contrast enhancement (CLAHE) to handle uneven lighting/faint dots
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        enhanced_gray = clahe.apply(gray)
-        # Convert back to 3-channel BGR as detect_dots_in_image may expect it
-        enhanced_img = cv2.cvtColor(enhanced_gray, cv2.COLOR_GRAY2BGR)
-            
-        detected_dots = detect_dots_in_image(enhanced_img)
-        # --------------------------------------------------------------------
+        # Recreation needs the dots found on the CLAHE-enhanced image; reuse them if seen before
+        dots_key = detection_key("enhanced-dots", image_hash, max_pixels, refine)
+        cached_dots = detection_cache.get(dots_key)
         
-        # --- ATTEMPT COMPLEX RECREATION ---
-        try:
-            recreator = KolamRecreator()
-            # detected_dots is List[Tuple[float, float]]
-            # Pass the path to the original file for the recreation logic to read
-            recreated_image_path = recreator.recreate(detected_dots, file_path) 
-            return {"recreatedImage": recreated_image_path}
-            
-        except Exception as e:
-            # --- FALLBACK: Generate Random Rangoli ---
-            print(f"Kolam recreation failed ({str(e)}). Falling back to random rendering.")
-            
-            if not detected_dots:
-                raise Exception("Kolam recreation failed and no dots were detected for fallback.")
-
-            num_dots_to_connect = min(15, len(detected_dots))
-            
-            # Select dots to be part of the random pattern
-            active_dots = random.sample(detected_dots, num_dots_to_connect)
-            random_paths = []
-            
-            if len(active_dots) >= 2:
-                # Loop through the dots and create LinePaths between them
-                for i in range(len(active_dots)):
-                    p1_tuple = active_dots[i]
-                    p2_tuple = active_dots[(i + 1) % len(active_dots)] 
-                    
-                    # Create Dot objects for LinePath
-                    p1 = Dot(x=p1_tuple[0], y=p1_tuple[1])
-                    p2 = Dot(x=p2_tuple[0], y=p2_tuple[1])
-                    
-                    # NOTE: Using LinePath for the simple random fallback
-                    line_path = LinePath(p1=p1, p2=p2)
-                    random_paths.append(line_path)
-            
-            # Use the original list of tuples (detected_dots) for rendering
-            fallback_filename = render_kolam(
-                detected_dots,
-                random_paths
-            )
-            return {"recreatedImage": fallback_filename}
-
+        recreated_image_path, detected_dots, path_stats = await worker_pool.run(
+            recreate_kolam_image,
+            content,
+            max_pixels,
+            refine,
+            cached_dots,
+            seed,
+        )
+        if cached_dots is None:
+            detection_cache.set(dots_key, detected_dots)
+        if path_stats:
+            print(f"Recreation: {path_stats['paths']} paths, {path_stats['duplicates_removed']} duplicates removed")
+        result = {"recreatedImage": recreated_image_path, "pathStats": path_stats, "seed": seed}
+        recreate_cache.set(key, result)
+        return JSONResponse(result, headers=headers)
+
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"Kolam processing failed: {str(e)}"})
-        
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
 
 
+# Concurrent /api/predict calls share SimpleCNN forward passes
+predict_batcher = MicroBatcher(predict_batch, PREDICT_MAX_BATCH, PREDICT_MAX_WAIT_MS, PREDICT_MAX_QUEUE)
+
 @app.post("/api/predict")
 async def predict_image(file: UploadFile = File(...)):
-    file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}_{file.filename}")
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    image = read_upload_image(await file.read())
 
-    result = predict(file_path)
-    os.remove(file_path)
+    result = await predict_batcher.submit(image)
     return {"prediction": result}
 
+@app.get("/api/predict/stats")
+def predict_stats():
+    return predict_batcher.status()
+
+# Upper bound on images per /api/predict/batch request
+BATCH_PREDICT_MAX_IMAGES = int(os.environ.get("KOLAM_BATCH_PREDICT_MAX_IMAGES", "10000"))
+# Largest uncompressed image accepted from an archive
+BATCH_PREDICT_MAX_IMAGE_BYTES = int(os.environ.get("KOLAM_BATCH_PREDICT_MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+# Largest ?batch_size= (images per forward pass)
+BATCH_PREDICT_MAX_BATCH_SIZE = int(os.environ.get("KOLAM_BATCH_PREDICT_MAX_BATCH_SIZE", "128"))
+
+@app.post("/api/predict/batch")
+async def predict_images_batch(
+    files: List[UploadFile] = File(default=[]),
+    archive: Optional[UploadFile] = File(default=None),
+    top_k: int = 3,
+    batch_size: int = Query(32, ge=1, le=BATCH_PREDICT_MAX_BATCH_SIZE),
+):
+    """
+    Classifies many images, sent as repeated `files` parts and/or a zip `archive`.
+    Streams one JSON line per image: {"name", "predictions": [{"label", "probability"}]}
+    or {"name", "error"}.
+    """
+    named_images = [(f.filename, await f.read()) for f in files]
+    archive_bytes = await archive.read() if archive is not None else None
+    if not named_images and not archive_bytes:
+        raise HTTPException(status_code=400, detail="Send images as 'files' or a zip as 'archive'")
+    if len(named_images) > BATCH_PREDICT_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_PREDICT_MAX_IMAGES} images per request")
+
+    archive_images = iter(())
+    if archive_bytes:
+        # The archive is checked up front: fail fast rather than mid-stream
+        try:
+            archive_images = iter_archive_images(
+                archive_bytes,
+                BATCH_PREDICT_MAX_IMAGES - len(named_images),
+                BATCH_PREDICT_MAX_IMAGE_BYTES,
+            )
+        except ArchiveTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    def images():
+        yield from named_images
+        yield from archive_images
+
+    def lines():
+        for result in classify_images(images(), k=top_k, batch_size=batch_size):
+            yield json.dumps(result) + "\n"
+
+    # Sync generator: Starlette runs it in a thread, one batch at a time
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @app.post("/api/llm")
 async def get_better_image_with_llm(file: UploadFile = File(...)):
     file_bytes = await file.read()
     file_b64 = base64.b64encode(file_bytes).decode("utf-8")
-    result = llm_image(file_b64, mime_type=file.content_type)
+    result = await run_in_threadpool(llm_image, file_b64, mime_type=file.content_type)
 
     return {"llmRecreate": result}
 
@@ -334,18 +512,16 @@ async def get_better_image_with_stability(file: UploadFile = File(...)):
     file_b64 = base64.b64encode(file_bytes).decode("utf-8")
 
     prompt = "Make this rangoli (kolam) design more aesthetic, colorful, and traditional."
-    result = sd_image(file_b64, prompt=prompt)
+    result = await run_in_threadpool(sd_image, file_b64, prompt=prompt)
 
     return {"llmRecreate": f"/img/{result}"}
 
 @app.post("/api/search")
 async def search_similar(file: UploadFile = File(...)):
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    content = await file.read()
+    image = read_upload_image(content)
 
-    results = find_similar(file_path, top_k=5)
-    os.remove(file_path)
+    results = await run_in_threadpool(find_similar, image, top_k=5, image_hash=content_hash(content))
     return {"matches": [p for p, d in results]}
 
 
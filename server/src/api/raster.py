@@ -0,0 +1,165 @@
+# src/api/raster.py
+"""
+Raster (PNG/WebP) output for kolams, drawn straight into an OpenCV canvas.
+
+`rasterize` draws dots, lines and quadratic Béziers at any size; `read_svg`
+reads the geometry back out of an SVG written by src.api.render (and the
+older per-element svgwrite files), so thumbnails don't need a browser-grade
+SVG renderer. Bitmaps such as the LLM/Stability images are just resized.
+"""
+import re
+import xml.etree.ElementTree as ET
+from typing import List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from src.api.geometry import PathArrays
+from src.api.render import DOT_RADIUS, STROKE_WIDTH, VIEWBOX
+
+RASTER_FORMATS = {"png": ".png", "webp": ".webp"}
+MEDIA_TYPES = {"png": "image/png", "webp": "image/webp"}
+
+SHIFT = 4  # cv2 fixed-point bits: coordinates are drawn with 1/16 px precision
+_ONE = 1 << SHIFT
+
+_TOKEN = re.compile(r"[MLQmlq]|-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+def _bezier_polylines(curves: np.ndarray, scale: float) -> List[np.ndarray]:
+    """
+    Samples quadratic Béziers (N x 6 array: p1, ctrl, p2) into polylines,
+    with roughly one vertex every 2 output pixels along the control polygon.
+    """
+    polylines = []
+    p1, ctrl, p2 = curves[:, 0:2], curves[:, 2:4], curves[:, 4:6]
+    lengths = (np.linalg.norm(ctrl - p1, axis=1) + np.linalg.norm(p2 - ctrl, axis=1)) * scale
+    steps = np.clip(np.ceil(lengths / 2), 2, 256).astype(int)
+    # Curves with the same step count are evaluated together
+    for n in np.unique(steps):
+        group = steps == n
+        t = np.linspace(0, 1, n + 1)[None, :, None]
+        points = ((1 - t) ** 2 * p1[group, None] + 2 * (1 - t) * t * ctrl[group, None] + t ** 2 * p2[group, None])
+        polylines.extend(points)
+    return polylines
+
+
+def _fixed(points: np.ndarray, scale: float, origin: np.ndarray) -> np.ndarray:
+    return np.round((points - origin) * scale * _ONE).astype(np.int32)
+
+
+def rasterize(
+    dots: Sequence[Tuple[float, float]],
+    lines: Sequence[Sequence[float]],
+    curves: Sequence[Sequence[float]],
+    size: int,
+    viewbox: Sequence[float] = VIEWBOX,
+) -> np.ndarray:
+    """
+    Draws black dots, lines (x1, y1, x2, y2) and quadratic curves
+    (x1, y1, cx, cy, x2, y2) on a white size x size BGR canvas.
+    """
+    canvas = np.full((size, size, 3), 255, dtype=np.uint8)
+    min_x, min_y, width, height = viewbox
+    scale = size / max(width, height)
+    origin = np.array([min_x, min_y], dtype=float)
+    thickness = max(1, round(STROKE_WIDTH * scale))
+    black = (0, 0, 0)
+
+    segments = [_fixed(np.asarray(line, dtype=float).reshape(2, 2), scale, origin) for line in lines]
+    if len(curves):
+        curves = np.asarray(curves, dtype=float).reshape(-1, 6)
+        segments.extend(_fixed(poly, scale, origin) for poly in _bezier_polylines(curves, scale))
+    if segments:
+        cv2.polylines(canvas, segments, False, black, thickness, cv2.LINE_AA, SHIFT)
+
+    radius = max(1, round(DOT_RADIUS * scale * _ONE))
+    for x, y in _fixed(np.asarray(dots, dtype=float).reshape(-1, 2), scale, origin):
+        cv2.circle(canvas, (int(x), int(y)), radius, black, -1, cv2.LINE_AA, SHIFT)
+    return canvas
+
+
+def encode(canvas: np.ndarray, fmt: str) -> bytes:
+    ok, buffer = cv2.imencode(RASTER_FORMATS[fmt], canvas)
+    if not ok:
+        raise ValueError(f"Could not encode image as {fmt}")
+    return buffer.tobytes()
+
+
+def _parse_path_data(d: str, lines: list, curves: list) -> None:
+    """Collects M/L/Q segments (absolute or relative) from SVG path data."""
+    tokens = _TOKEN.findall(d)
+    i, command = 0, "M"
+    x = y = 0.0
+
+    def take(n):
+        nonlocal i
+        values = [float(v) for v in tokens[i:i + n]]
+        i += n
+        return values
+
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+        relative = command.islower()
+        dx, dy = (x, y) if relative else (0.0, 0.0)
+        upper = command.upper()
+        if upper == "M":
+            x, y = (v + o for v, o in zip(take(2), (dx, dy)))
+            command = "l" if relative else "L"  # extra pairs after M are lines
+        elif upper == "L":
+            nx, ny = (v + o for v, o in zip(take(2), (dx, dy)))
+            lines.append((x, y, nx, ny))
+            x, y = nx, ny
+        elif upper == "Q":
+            cx, cy, nx, ny = (v + o for v, o in zip(take(4), (dx, dy, dx, dy)))
+            curves.append((x, y, cx, cy, nx, ny))
+            x, y = nx, ny
+        else:
+            i += 1  # unsupported command: skip its argument
+
+
+def read_svg(path: str) -> Tuple[list, list, list, Tuple[float, ...]]:
+    """Dots, lines, curves and viewBox of a kolam SVG."""
+    dots, lines, curves = [], [], []
+    viewbox = VIEWBOX
+    for _, element in ET.iterparse(path, events=("start",)):
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag == "svg" and element.get("viewBox"):
+            viewbox = tuple(float(v) for v in re.split(r"[\s,]+", element.get("viewBox").strip()))
+        elif tag == "circle":
+            dots.append((float(element.get("cx", 0)), float(element.get("cy", 0))))
+        elif tag == "line":
+            lines.append(tuple(float(element.get(a, 0)) for a in ("x1", "y1", "x2", "y2")))
+        elif tag == "path":
+            _parse_path_data(element.get("d", ""), lines, curves)
+    return dots, lines, curves, viewbox
+
+
+def thumbnail(path: str, size: int, fmt: str = "png") -> bytes:
+    """
+    Encoded size x size (at most) thumbnail of a stored kolam: SVGs are
+    rasterized from their geometry, bitmaps are downscaled.
+    """
+    if path.lower().endswith(".svg"):
+        try:
+            dots, lines, curves, viewbox = read_svg(path)
+        except ET.ParseError as e:
+            raise ValueError(f"Could not parse SVG {path}: {e}")
+        return encode(rasterize(dots, lines, curves, size, viewbox), fmt)
+
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Could not read image {path}")
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+    return encode(image, fmt)
+
+
+def kolam_geometry(paths) -> Tuple[np.ndarray, np.ndarray]:
+    """Splits LinePath/CurvePath objects into N x 4 line and N x 6 curve arrays."""
+    arrays = PathArrays.from_paths(paths)
+    return arrays.lines, arrays.curves
@@ -1,12 +1,14 @@
 import numpy as np
 import math
-from typing import List, Tuple, Union, Dict
+from typing import List, Optional, Tuple, Union, Dict
 import random 
 import cv2 
 import os
 
 # ASSUMED IMPORTS: These classes must match the definitions used elsewhere (e.g., src.api.schemas)
 class Point:
+    __slots__ = ("x", "y")
+
     def __init__(self, x: float, y: float):
         self.x = x
         self.y = y
@@ -17,11 +19,15 @@ class Point:
         return self.x == other.x and self.y == other.y
 
 class LinePath:
+    __slots__ = ("p1", "p2")
+
     def __init__(self, p1: Point, p2: Point):
         self.p1 = p1
         self.p2 = p2
 
 class CurvePath:
+    __slots__ = ("p1", "ctrl", "p2")
+
     def __init__(self, p1: Point, ctrl: Point, p2: Point):
         self.p1 = p1
         self.ctrl = ctrl
@@ -29,36 +35,55 @@ class CurvePath:
 
 # Assume render_kolam is imported from render.py
 from .render import render_kolam 
+from .lattice import Lattice
+from .geometry import SYMMETRY_GROUPS, PathArrays, transform
+from .img_processing import KolamAnalysis
 
 DotTuple = Tuple[float, float]
 PathType = Union[LinePath, CurvePath]
+# A file path, a decoded BGR array, or the KolamAnalysis the dots were detected with
+ImageSource = Union[str, np.ndarray, KolamAnalysis]
+# Part of the cached /api/recreate key: bump it whenever recreation output changes
+RECREATOR_VERSION = 2
 
 class KolamRecreator:
     """
     Generates authentic, symmetric Kolam paths by inferring grid relationships 
     between detected dots and generating looping Bezier curves.
     """
-    def __init__(self, proximity_threshold: int = 200): # Increased to 200
+    def __init__(self, proximity_threshold: int = 200, symmetry: str = "c4", seed: Optional[int] = None): # Increased to 200
+        if symmetry not in SYMMETRY_GROUPS:
+            raise ValueError(f"Unknown symmetry {symmetry!r}, expected one of {sorted(SYMMETRY_GROUPS)}")
         self.proximity_threshold = proximity_threshold 
+        self.symmetry = symmetry
+        # With a seed, every recreate() call draws the same loop bulges, so
+        # identical input always renders the same SVG (and the same file name)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.last_stats: Dict[str, int] = {}
         self.viewbox_size = 500 # Target size for all coordinate geometry
         self.center = Point(self.viewbox_size / 2, self.viewbox_size / 2) 
         self.tolerance = 30 # Increased to 30
         
-    def _load_and_enhance_image(self, image_path: str) -> np.ndarray:
-        """Loads, converts to grayscale, and enhances image contrast (CLAHE)."""
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"Image not found at path: {image_path}")
+    def _read_image(self, image: Union[str, np.ndarray]) -> np.ndarray:
+        """Returns a decoded image as is, or loads it if given a path."""
+        if isinstance(image, np.ndarray):
+            return image
+        if not os.path.exists(image):
+            raise FileNotFoundError(f"Image not found at path: {image}")
             
-        img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        img = cv2.imread(image, cv2.IMREAD_COLOR)
         if img is None:
             raise IOError("Could not load image using OpenCV.")
-            
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        enhanced_gray = clahe.apply(gray)
-        
-        return enhanced_gray
-    
+        return img
+
+    def _image_size(self, image: ImageSource) -> Tuple[int, int]:
+        """(width, height) of the source image, the only thing recreation needs from it."""
+        if isinstance(image, KolamAnalysis):
+            return image.width, image.height
+        height, width = self._read_image(image).shape[:2]
+        return width, height
+
     def _draw_minor_curve(self, image_data: np.ndarray, dots: List[Point]):
         """Placeholder for logic to draw small, local features."""
         pass
@@ -162,7 +187,7 @@ class KolamRecreator:
             
         # Determine bulge distance based on segment length (10% to 20% of segment length)
         segment_length = math.sqrt(seg_x**2 + seg_y**2)
-        bulge_distance = segment_length * random.uniform(0.1, 0.2) 
+        bulge_distance = segment_length * self.rng.uniform(0.1, 0.2) 
         
         # Calculate final control point
         ctrl_x = mid_x + unit_perp_x * bulge_distance
@@ -170,43 +195,46 @@ class KolamRecreator:
 
         return CurvePath(p1, Point(ctrl_x, ctrl_y), p2)
 
-    def _rotate_point(self, p: Point, angle_deg: int) -> Point:
-        """Rotates a point around the center (250, 250) by a given angle."""
-        angle_rad = math.radians(angle_deg)
-        x = p.x - self.center.x
-        y = p.y - self.center.y
-        
-        new_x = x * math.cos(angle_rad) - y * math.sin(angle_rad)
-        new_y = x * math.sin(angle_rad) + y * math.cos(angle_rad)
-        
-        return Point(new_x + self.center.x, new_y + self.center.y)
-
-    def _create_symmetrical_paths(self, detected_paths: List[PathType]) -> List[PathType]:
+    def _symmetrical_arrays(self, detected_paths: List[PathType]) -> PathArrays:
         """
-        Takes the base paths and generates 90, 180, and 270 degree rotations,
-        enforcing C4 symmetry.
+        Base paths plus every curve's images under the symmetry group (90, 180
+        and 270 degree rotations for C4), computed in one batched transform.
+        Copies of a curve stay together, after all the base curves.
+
+        A copy landing on a pair of dots that already has a loop bulging the
+        same way is dropped, whatever its own random bulge; the counts are
+        recorded in last_stats.
         """
-        symmetrical_paths: List[PathType] = detected_paths.copy()
-        
-        for path in detected_paths:
-            for angle in [90, 180, 270]:
-                if isinstance(path, CurvePath):
-                    new_p1 = self._rotate_point(path.p1, angle)
-                    new_p2 = self._rotate_point(path.p2, angle)
-                    new_ctrl = self._rotate_point(path.ctrl, angle)
-                    symmetrical_paths.append(CurvePath(new_p1, new_ctrl, new_p2))
-                                    
-        return symmetrical_paths
-
-    def recreate(self, detected_dots: List[DotTuple], image_path: str) -> str:
+        arrays = PathArrays.from_paths(detected_paths)
+        if len(arrays.curves):
+            # Skip the identity: the base curves are already in the output
+            matrices = SYMMETRY_GROUPS[self.symmetry][1:]
+            copies = transform(arrays.curves, matrices, (self.center.x, self.center.y)).reshape(-1, 6)
+            arrays.curves = np.vstack([arrays.curves, copies])
+
+        generated = len(arrays)
+        arrays = arrays.deduplicate()
+        self.last_stats = {
+            "base_paths": len(detected_paths),
+            "paths": len(arrays),
+            "duplicates_removed": generated - len(arrays),
+        }
+        return arrays
+
+    def recreate(self, detected_dots: List[DotTuple], image: ImageSource) -> str:
         """
         Main function to orchestrate recreation and rendering using grid inference.
+        `image` is the source image as a path, an already-decoded BGR array, or
+        the KolamAnalysis the dots came from; only its size is used, so a
+        decoded image or analysis is never read or enhanced again.
         """
-        # --- 0. Load and Pre-process Image ---
+        self.last_stats = {}
+        self.rng = random.Random(self.seed)
+
+        # --- 0. Source Image Size ---
         try:
-            enhanced_image = self._load_and_enhance_image(image_path)
             # Use original dimensions from the image to correctly scale the dot coordinates
-            original_height, original_width = enhanced_image.shape[:2]
+            original_width, original_height = self._image_size(image)
         except Exception as e:
             print(f"ERROR loading image for geometry: {e}. Proceeding with unscaled dots if available.")
             original_width, original_height = 0, 0 
@@ -230,8 +258,19 @@ class KolamRecreator:
         detected_paths: List[PathType] = []
         processed_pairs = set()
 
+        # Infer the dot lattice once; neighbours are then a (row, col) lookup.
+        # Irregular layouts (lattice is None, or a dot off the grid) fall back to the pairwise scan.
+        lattice = Lattice.fit(np.asarray(scaled_dots)) if len(scaled_dots) else None
+        dot_index: Dict[DotTuple, int] = {}
+        for i, point in enumerate(all_dot_points):
+            dot_index.setdefault((point.x, point.y), i)
+
         for dot1 in base_dots:
-            neighbors = self._find_neighbors(dot1, all_dot_points)
+            lattice_neighbors = lattice.neighbours(dot_index[(dot1.x, dot1.y)], self.proximity_threshold) if lattice else None
+            if lattice_neighbors is None:
+                neighbors = self._find_neighbors(dot1, all_dot_points)
+            else:
+                neighbors = {key: all_dot_points[i] for key, i in lattice_neighbors.items()}
             
             # Horizontal neighbor loop
             if 'x_neighbor' in neighbors:
@@ -254,7 +293,8 @@ class KolamRecreator:
             return render_kolam(scaled_dots, [])
 
         # --- 4. SYMMETRY ENFORCEMENT ---
-        final_paths = self._create_symmetrical_paths(detected_paths)
+        # Kept as arrays: the renderer serializes them without building path objects
+        final_paths = self._symmetrical_arrays(detected_paths)
         
         # --- 5. RENDERING ---
         return render_kolam(scaled_dots, final_paths)
@@ -0,0 +1,98 @@
+# src/api/registry.py
+"""
+Lazily loaded models and clients.
+
+Modules register a loader instead of building heavy objects at import time;
+the first `registry.get(name)` call (or the startup warm-up thread) runs it
+once and later calls reuse the result. This keeps `import src.api.main`
+cheap, so uvicorn workers and --reload restarts come up immediately, and a
+missing optional model or API key only fails the endpoints that need it.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable
+
+# Models loaded in the background at startup; comma-separated, empty disables warm-up
+WARMUP_MODELS = [m for m in os.environ.get("KOLAM_WARMUP_MODELS", "clip,simplecnn").split(",") if m]
+
+
+class LazyModel:
+    """A value built by `loader` on first use, at most once."""
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self.loader = loader
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.error = None
+        self.load_seconds = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> Any:
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                try:
+                    self._value = self.loader()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.load_seconds = round(time.perf_counter() - start, 3)
+                self.error = None
+                self._loaded = True
+        return self._value
+
+    def status(self) -> dict:
+        if self._loaded:
+            state = "loaded"
+        elif self._lock.locked():
+            state = "loading"
+        elif self.error:
+            state = "failed"
+        else:
+            state = "not_loaded"
+        return {"state": state, "load_seconds": self.load_seconds, "error": self.error}
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models: Dict[str, LazyModel] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]) -> LazyModel:
+        self._models[name] = LazyModel(name, loader)
+        return self._models[name]
+
+    def get(self, name: str) -> Any:
+        return self._models[name].get()
+
+    def warm_up(self, names: Iterable[str] = ()) -> threading.Thread:
+        """Loads the named models one after another in a background thread."""
+        names = [n for n in names if n in self._models]
+
+        def run():
+            for name in names:
+                try:
+                    self.get(name)
+                    print(f"Model '{name}' loaded in {self._models[name].load_seconds}s")
+                except Exception as e:
+                    print(f"⚠️ Could not load model '{name}': {e}")
+
+        thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def ready(self, names: Iterable[str] = ()) -> bool:
+        return all(self._models[n].loaded for n in names if n in self._models)
+
+    def status(self) -> dict:
+        return {name: model.status() for name, model in self._models.items()}
+
+
+registry = ModelRegistry()
@@ -1,47 +1,103 @@
-import svgwrite
-import time
-from typing import Sequence, Tuple, Union
+from itertools import islice
+from typing import Iterator, Sequence, Tuple, Union
 
+from src.api.geometry import PathArrays
 from src.api.schemas import LinePath, CurvePath, Dot
+from src.api.storage import IMG_DIR, store_bytes
 
 DotTuple = Tuple[float, float]
 
+VIEWBOX = (0, 0, 500, 500)
+DOT_RADIUS = 3
+STROKE_WIDTH = 2
+# Path segments per emitted chunk when streaming
+CHUNK_SEGMENTS = 512
+
+SVG_HEADER = (
+    '<?xml version="1.0" encoding="utf-8" ?>\n'
+    '<svg baseProfile="tiny" height="100%" version="1.2" viewBox="{},{},{},{}" width="100%" '
+    'xmlns="http://www.w3.org/2000/svg" xmlns:ev="http://www.w3.org/2001/xml-events" '
+    'xmlns:xlink="http://www.w3.org/1999/xlink"><defs />'
+)
+
+
+def _num(value: float) -> str:
+    """Shortest form of a coordinate, to 1/100 px."""
+    text = f"{value:.2f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def _segment(path: Union[LinePath, CurvePath]) -> str:
+    """Path data for one line or quadratic curve (anything with p1/p2 and optional ctrl)."""
+    ctrl = getattr(path, "ctrl", None)
+    if ctrl is None:
+        return f"M{_num(path.p1.x)} {_num(path.p1.y)}L{_num(path.p2.x)} {_num(path.p2.y)}"
+    return (f"M{_num(path.p1.x)} {_num(path.p1.y)}"
+            f"Q{_num(ctrl.x)} {_num(ctrl.y)} {_num(path.p2.x)} {_num(path.p2.y)}")
+
+
+def _array_segments(paths: PathArrays) -> Iterator[str]:
+    """Path data for PathArrays: lines, then curves."""
+    nums = [_num(v) for v in paths.lines.ravel().tolist()]
+    for i in range(0, len(nums), 4):
+        yield f"M{nums[i]} {nums[i + 1]}L{nums[i + 2]} {nums[i + 3]}"
+    nums = [_num(v) for v in paths.curves.ravel().tolist()]
+    for i in range(0, len(nums), 6):
+        yield f"M{nums[i]} {nums[i + 1]}Q{nums[i + 2]} {nums[i + 3]} {nums[i + 4]} {nums[i + 5]}"
+
+
+def iter_svg(
+    dots: Sequence[DotTuple],
+    paths: Union[Sequence[Union[LinePath, CurvePath]], PathArrays]
+) -> Iterator[str]:
+    """
+    Serializes the Kolam as SVG text in chunks: black dots, then every line
+    and curve as one black-stroked <path>, since they all share a style.
+    Paths can be path objects or a PathArrays.
+    """
+    yield SVG_HEADER.format(*VIEWBOX)
+
+    circles = [f'<circle cx="{_num(x)}" cy="{_num(y)}" fill="black" r="{DOT_RADIUS}" />' for x, y in dots]
+    if circles:
+        yield "".join(circles)
+
+    if len(paths):
+        segments = _array_segments(paths) if isinstance(paths, PathArrays) else map(_segment, paths)
+        yield f'<path fill="none" stroke="black" stroke-width="{STROKE_WIDTH}" d="'
+        for _ in range(0, len(paths), CHUNK_SEGMENTS):
+            yield "".join(islice(segments, CHUNK_SEGMENTS))
+        yield '" />'
+
+    yield "</svg>"
+
+
+def svg_document(
+    dots: Sequence[DotTuple],
+    paths: Union[Sequence[Union[LinePath, CurvePath]], PathArrays]
+) -> str:
+    """Renders the Kolam to an SVG string in memory."""
+    return "".join(iter_svg(dots, paths))
+
+
+def save_svg(svg: str, img_dir: str = IMG_DIR) -> str:
+    """
+    Stores an SVG under its content hash and returns the filename.
+    Identical drawings share one file, so repeat renders write nothing.
+    """
+    return f"{img_dir}/{store_bytes(svg.encode('utf-8'), img_dir, '_kolam.svg')}"
+
+
 def render_kolam(
     dots: Sequence[DotTuple],
-    paths: Sequence[Union[LinePath, CurvePath]]
+    paths: Union[Sequence[Union[LinePath, CurvePath]], PathArrays],
+    save: bool = True,
 ) -> str:
     """
     Renders the Kolam as an SVG with black dots and black lines/curves.
+    Returns the saved filename, or the SVG text itself when save is False.
     """
-    filename = f"img/{time.time()}_kolam.svg"
-    dwg = svgwrite.Drawing(filename, profile="tiny")
-    dwg.viewbox(0, 0, 500, 500)
-
-    print(f"Rendering {len(dots)} dots and {len(paths)} paths to {filename}")
-
-    # draw dots (already black)
-    for x, y in dots:
-        dwg.add(dwg.circle(center=(x, y), r=3, fill="black"))
-
-    # draw paths (updated to black stroke)
-    for path in paths:
-        if isinstance(path, LinePath):
-            dwg.add(dwg.line(
-                start=(path.p1.x, path.p1.y),
-                end=(path.p2.x, path.p2.y),
-                stroke="black",  # CHANGED from "blue" to "black"
-                stroke_width=2
-            ))
-        elif isinstance(path, CurvePath):
-            dwg.add(dwg.path(
-                d=f"M{path.p1.x},{path.p1.y} Q{path.ctrl.x},{path.ctrl.y} {path.p2.x},{path.p2.y}",
-                stroke="black",  # CHANGED from "red" to "black"
-                fill="none",
-                stroke_width=2
-            ))
-
-    dwg.save()
-    return filename
+    svg = svg_document(dots, paths)
+    return save_svg(svg) if save else svg
 
 def reconstruct_paths(path_data):
     paths = []
@@ -57,4 +113,4 @@ def reconstruct_paths(path_data):
                 ctrl=Dot(**path["ctrl"]),
                 p2=Dot(**path["p2"])
             ))
-    return paths
\ No newline at end of file
+    return paths
@@ -0,0 +1,174 @@
+# src/api/storage.py
+"""
+Storage management for generated files.
+
+Everything the server writes to img/ (rendered SVGs, LLM/Stability images)
+goes through `store_bytes`, which names files by their content hash: a
+repeated render or download reuses the existing file instead of adding one.
+
+`storage` keeps each managed directory within an age, size and file-count
+budget. A background task started with the app sweeps every
+KOLAM_SWEEP_INTERVAL seconds, deleting expired files and then the oldest
+ones until the directory is back under budget. Files younger than
+KOLAM_SWEEP_GRACE seconds are never deleted, so a client always has time to
+fetch a filename it was just given.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+IMG_DIR = "img"
+
+SWEEP_INTERVAL = float(os.environ.get("KOLAM_SWEEP_INTERVAL", "600"))
+SWEEP_GRACE = float(os.environ.get("KOLAM_SWEEP_GRACE", "300"))
+IMG_MAX_BYTES = int(os.environ.get("KOLAM_IMG_MAX_BYTES", str(1024 * 1024 * 1024)))
+IMG_MAX_FILES = int(os.environ.get("KOLAM_IMG_MAX_FILES", "100000"))
+IMG_MAX_AGE = float(os.environ.get("KOLAM_IMG_MAX_AGE", str(30 * 24 * 3600)))
+
+
+def content_name(data: bytes, suffix: str) -> str:
+    """File name for data: hex SHA-256 prefix plus suffix (e.g. "_kolam.svg", ".png")."""
+    return hashlib.sha256(data).hexdigest()[:32] + suffix
+
+
+def store_bytes(data: bytes, directory: str, suffix: str) -> str:
+    """
+    Writes data under its content-addressed name in directory (atomically,
+    and only if it isn't there already). Returns the file name.
+    """
+    name = content_name(data, suffix)
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        os.utime(path)  # counts as fresh for the age/size policy
+    else:
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # readers never see a partial file
+    return name
+
+
+class ManagedDir:
+    """A directory kept under max_bytes / max_files, with files expiring after max_age seconds."""
+
+    def __init__(self, path: str, max_bytes: int, max_files: int, max_age: float, grace: float = SWEEP_GRACE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_age = max_age
+        self.grace = grace
+        self.last_sweep: Optional[dict] = None
+        self.totals = {"sweeps": 0, "removed_files": 0, "removed_bytes": 0}
+
+    def _scan(self) -> list:
+        """(mtime, size, path) for every file, oldest first."""
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+        for entry in os.scandir(self.path):
+            try:
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except FileNotFoundError:
+                continue
+        entries.sort()
+        return entries
+
+    def sweep(self) -> dict:
+        """Deletes expired files, then the oldest ones until under budget."""
+        start = time.perf_counter()
+        now = time.time()
+        entries = self._scan()
+        files, total = len(entries), sum(size for _, size, _ in entries)
+        removed_files = removed_bytes = 0
+
+        for mtime, size, path in entries:
+            age = now - mtime
+            over_budget = files > self.max_files or total > self.max_bytes
+            if age < self.grace or not (age > self.max_age or over_budget):
+                # Oldest first: once a file is kept, every later one is younger
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            files -= 1
+            total -= size
+            removed_files += 1
+            removed_bytes += size
+
+        self.last_sweep = {
+            "at": round(now),
+            "removed_files": removed_files,
+            "removed_bytes": removed_bytes,
+            "files": files,
+            "bytes": total,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        self.totals["sweeps"] += 1
+        self.totals["removed_files"] += removed_files
+        self.totals["removed_bytes"] += removed_bytes
+        return self.last_sweep
+
+    def status(self) -> dict:
+        """Limits and the file/byte counts from the last sweep (no directory scan)."""
+        return {
+            "path": self.path,
+            "max_bytes": self.max_bytes,
+            "max_files": self.max_files,
+            "max_age": self.max_age,
+            "last_sweep": self.last_sweep,
+            **self.totals,
+        }
+
+
+class StorageManager:
+    """Managed directories plus the background task that sweeps them."""
+
+    def __init__(self, interval: float = SWEEP_INTERVAL):
+        self.interval = interval
+        self.dirs: Dict[str, ManagedDir] = {}
+        self._task = None
+
+    def manage(self, name: str, directory: ManagedDir) -> ManagedDir:
+        self.dirs[name] = directory
+        return directory
+
+    def sweep(self) -> dict:
+        results = {}
+        for name, directory in self.dirs.items():
+            try:
+                results[name] = directory.sweep()
+            except OSError as e:
+                print(f"⚠️ Sweeping {directory.path} failed: {e}")
+        return results
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            # Directory scans block, keep them off the event loop
+            await loop.run_in_executor(None, self.sweep)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def status(self) -> dict:
+        return {name: directory.status() for name, directory in self.dirs.items()}
+
+
+storage = StorageManager()
+storage.manage("img", ManagedDir(IMG_DIR, IMG_MAX_BYTES, IMG_MAX_FILES, IMG_MAX_AGE))
+# Left over from when uploads were written to disk; nothing new is added
+storage.manage("uploads", ManagedDir("uploads", 0, 0, 0))
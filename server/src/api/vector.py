@@ -1,57 +1,312 @@
 # src/api/vector.py
+import functools
+import json
+import math
 import os
 import pickle
-from typing import List, Tuple
+import threading
+import time
+from typing import List, Optional, Tuple, Union
 import numpy as np
 import torch
 import clip
 from PIL import Image
 import faiss
+from concurrent.futures import ThreadPoolExecutor
+from src.api.cache import make_cache
+from src.api.registry import registry
 
 DATA_DIR = "imgdata"
 INDEX_FILE = "image_index.faiss"
 META_FILE = "image_paths.pkl"
+CONFIG_FILE = "image_index.json"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
 
-# Load CLIP model (cached on first use)
+EMBEDDING_DIM = 512  # ViT-B/32 image embedding size
+BATCH_SIZE = int(os.environ.get("KOLAM_EMBED_BATCH_SIZE", "32"))
+DECODE_WORKERS = int(os.environ.get("KOLAM_DECODE_WORKERS", "4"))
+
+# Index type for new builds: "flat" (exact), "ivf" (IVF-Flat), "hnsw", or "ivfpq" (compressed)
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+INDEX_TYPE = os.environ.get("KOLAM_INDEX_TYPE", "flat")
+# Faiss' k-means wants at least this many training vectors per centroid
+MIN_TRAINING_POINTS = 39
+
+# Distance for new builds: "l2" on raw CLIP vectors, or "ip" (inner product on
+# L2-normalized vectors, i.e. cosine similarity). Saved indexes keep their own.
+INDEX_METRICS = ("l2", "ip")
+INDEX_METRIC = os.environ.get("KOLAM_INDEX_METRIC", "l2")
+
+# CLIP model, loaded on first use (or by the startup warm-up)
+CLIP_MODEL = "ViT-B/32"
 device = "cuda" if torch.cuda.is_available() else "cpu"
-_model, _preprocess = clip.load("ViT-B/32", device=device)
+registry.register("clip", lambda: clip.load(CLIP_MODEL, device=device))
+
+# Query embeddings by upload content hash, so repeated searches skip the forward pass
+embedding_cache = make_cache("query_embeddings")
 
 # Global FAISS index + metadata
 _index = None
 _image_paths: List[str] = []
+_index_config: dict = {"type": "flat", "metric": "l2"}
+# Routes call in from threadpool threads: the first-use load/build and every
+# update hold this lock, so concurrent requests can't rebuild or swap the
+# globals under each other. Reentrant because sync_index calls the others.
+_index_lock = threading.RLock()
+
+
+def _locked(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _index_lock:
+            return fn(*args, **kwargs)
+    return wrapper
 
 
-def _get_embedding(image_path: str) -> np.ndarray:
-    """Convert image to CLIP embedding."""
-    image = _preprocess(Image.open(image_path)).unsqueeze(0).to(device)
+def _load_image(image_path: str) -> Image.Image:
+    image = Image.open(image_path)
+    image.load()
+    return image
+
+
+def _embed_images(images: List[Image.Image]) -> np.ndarray:
+    """Embed a batch of PIL images with a single CLIP forward pass."""
+    model, preprocess = registry.get("clip")
+    batch = torch.stack([preprocess(image) for image in images]).to(device)
     with torch.no_grad():
-        embedding = _model.encode_image(image)
-    return embedding.cpu().numpy().astype("float32")
+        embeddings = model.encode_image(batch)
+    return embeddings.cpu().numpy().astype("float32")
 
 
-def build_index(save: bool = True) -> None:
-    """Build FAISS index from all images in data folder."""
-    global _index, _image_paths
-    _image_paths = [
-        os.path.join(DATA_DIR, f)
-        for f in os.listdir(DATA_DIR)
-        if f.lower().endswith((".jpg", ".jpeg", ".png"))
-    ]
+def _get_embedding(image: Union[str, Image.Image]) -> np.ndarray:
+    """Convert image (a path or an opened PIL image) to CLIP embedding."""
+    if isinstance(image, str):
+        image = _load_image(image)
+    return _embed_images([image])
+
+
+def _embed_paths(image_paths: List[str], batch_size: int = BATCH_SIZE) -> Tuple[List[str], np.ndarray]:
+    """
+    Embed image files in batches, DataLoader-style: the next batch is decoded
+    by a thread pool while the current one runs through CLIP.
+    Returns the paths that could be read and their embeddings (same order).
+    """
+    batches = [image_paths[i:i + batch_size] for i in range(0, len(image_paths), batch_size)]
+    embedded_paths: List[str] = []
+    embeddings = []
+
+    with ThreadPoolExecutor(max_workers=DECODE_WORKERS) as pool:
+        pending = [pool.submit(_load_image, p) for p in batches[0]] if batches else []
+        for i, batch in enumerate(batches):
+            current = pending
+            if i + 1 < len(batches):
+                pending = [pool.submit(_load_image, p) for p in batches[i + 1]]
+
+            images, paths = [], []
+            for path, future in zip(batch, current):
+                try:
+                    images.append(future.result())
+                    paths.append(path)
+                except Exception as e:
+                    print(f"Skipping unreadable image {path}: {e}")
+
+            if images:
+                embeddings.append(_embed_images(images))
+                embedded_paths.extend(paths)
+
+    if not embeddings:
+        return [], np.empty((0, EMBEDDING_DIM), dtype="float32")
+    return embedded_paths, np.vstack(embeddings)
+
+
+def _normalize(vectors: np.ndarray, metric: str) -> np.ndarray:
+    """Unit-length copies of the vectors for "ip" (cosine) search; unchanged for "l2"."""
+    if metric != "ip":
+        return vectors
+    vectors = np.array(vectors, dtype="float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _list_images(data_dir: str = DATA_DIR) -> List[str]:
+    return sorted(
+        os.path.join(data_dir, f)
+        for f in os.listdir(data_dir)
+        if f.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def _make_index(index_type: str, d: int, n: int, metric: str = "l2", **params) -> Tuple["faiss.Index", dict]:
+    """
+    Create an empty FAISS index of the given type and metric for n vectors of size d.
+    Returns the index and the config (type, metric + search defaults) saved next to it.
+    """
+    if metric not in INDEX_METRICS:
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {INDEX_METRICS}")
+    faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == "ip" else faiss.METRIC_L2
+
+    if index_type == "flat":
+        return faiss.IndexFlat(d, faiss_metric), {"type": "flat", "metric": metric}
+
+    if index_type == "hnsw":
+        m = params.get("hnsw_m", 32)
+        index = faiss.index_factory(d, f"HNSW{m}", faiss_metric)
+        index.hnsw.efConstruction = params.get("ef_construction", 80)
+        return index, {"type": "hnsw", "metric": metric, "hnsw_m": m, "ef_search": params.get("ef_search", 64)}
+
+    if index_type == "ivfpq" and n < MIN_TRAINING_POINTS * 2:
+        # Too few vectors to train even 1-bit codebooks: store them uncompressed
+        index_type = "ivf"
+
+    if index_type in ("ivf", "ivfpq"):
+        # ~4*sqrt(n) lists, keeping >= 39 training points per list
+        nlist = params.get("nlist") or max(1, min(int(4 * math.sqrt(n)), n // MIN_TRAINING_POINTS))
+        config = {"type": index_type, "metric": metric, "nlist": nlist, "nprobe": params.get("nprobe", min(nlist, 8))}
+        if index_type == "ivf":
+            return faiss.index_factory(d, f"IVF{nlist},Flat", faiss_metric), config
+        pq_m = params.get("pq_m", 64)  # bytes per vector; must divide d
+        # Each sub-quantizer trains 2**nbits centroids, keeping >= 39 points per centroid
+        max_nbits = int(math.log2(n / MIN_TRAINING_POINTS))
+        pq_nbits = min(params.get("pq_nbits") or 8, max_nbits)
+        config.update(pq_m=pq_m, pq_nbits=pq_nbits)
+        return faiss.index_factory(d, f"IVF{nlist},PQ{pq_m}x{pq_nbits}", faiss_metric), config
+
+    raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+
+
+def _search_params(config: dict, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Per-query search parameters (thread-safe, unlike setting them on the index)."""
+    if config["type"] in ("ivf", "ivfpq"):
+        return faiss.SearchParametersIVF(nprobe=nprobe or config["nprobe"])
+    if config["type"] == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=ef_search or config["ef_search"])
+    return None
+
+
+def _stored_vectors(index) -> np.ndarray:
+    """All vectors held by an index (decoded approximations for PQ)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    vectors = index.reconstruct_n(0, index.ntotal)
+    if ivf is not None:
+        ivf.make_direct_map(False)
+    return vectors
+
+
+@_locked
+def build_index(save: bool = True, index_type: Optional[str] = None, metric: Optional[str] = None, **params) -> None:
+    """
+    Build FAISS index from all images in data folder.
+    index_type and metric default to KOLAM_INDEX_TYPE / KOLAM_INDEX_METRIC;
+    params tune the index (nlist, nprobe, hnsw_m, ef_search, pq_m, pq_nbits).
+    IVF types are trained on the gallery.
+    """
+    global _index, _image_paths, _index_config
+    image_paths = _list_images()
 
-    if not _image_paths:
+    if not image_paths:
         raise RuntimeError(f"No images found in {DATA_DIR}/ folder.")
 
-    embeddings = [_get_embedding(p) for p in _image_paths]
-    embeddings = np.vstack(embeddings)
+    _image_paths, embeddings = _embed_paths(image_paths)
 
     d = embeddings.shape[1]
-    _index = faiss.IndexFlatL2(d)
+    metric = metric or INDEX_METRIC
+    _index, _index_config = _make_index(index_type or INDEX_TYPE, d, len(embeddings), metric, **params)
+    embeddings = _normalize(embeddings, metric)
+    if not _index.is_trained:
+        _index.train(embeddings)
     _index.add(embeddings)
 
     if save:
         save_index()
 
 
+@_locked
+def _ensure_index() -> None:
+    if _index is None:
+        try:
+            load_index()
+        except RuntimeError:
+            build_index()
+
+
+@_locked
+def add_images(image_paths: List[str], save: bool = True) -> int:
+    """
+    Append images to the index without re-embedding the ones already in it.
+    Returns the number of images added.
+    """
+    global _index, _index_config
+    if _index is None:
+        try:
+            load_index()
+        except RuntimeError:
+            # Nothing persisted yet: start an empty index
+            _index, _index_config = _make_index("flat", EMBEDDING_DIM, 0, INDEX_METRIC)
+
+    known = set(_image_paths)
+    new_paths = [p for p in dict.fromkeys(image_paths) if p not in known]
+    if not new_paths:
+        return 0
+
+    new_paths, embeddings = _embed_paths(new_paths)
+    if not new_paths:
+        return 0
+    _index.add(_normalize(embeddings, _index_config["metric"]))
+    _image_paths.extend(new_paths)
+
+    if save:
+        save_index()
+    return len(new_paths)
+
+
+@_locked
+def remove_images(image_paths: List[str], save: bool = True) -> int:
+    """Remove images from the index by path. Returns the number removed."""
+    global _index, _image_paths
+    _ensure_index()
+
+    to_remove = set(image_paths)
+    ids = [i for i, p in enumerate(_image_paths) if p in to_remove]
+    if not ids:
+        return 0
+
+    if _index_config["type"] == "flat":
+        # Flat indexes compact on removal, keeping the remaining vectors in order
+        _index.remove_ids(np.array(ids, dtype="int64"))
+    else:
+        # IVF ids don't compact and HNSW can't delete: re-add the kept vectors,
+        # reusing the existing training (coarse centroids, PQ codebooks)
+        keep = np.ones(_index.ntotal, dtype=bool)
+        keep[ids] = False
+        vectors = _stored_vectors(_index)[keep]
+        if _index_config["type"] == "hnsw":
+            _index, _ = _make_index("hnsw", _index.d, len(vectors), **_index_config)
+        else:
+            _index.reset()
+        _index.add(vectors)
+    _image_paths = [p for p in _image_paths if p not in to_remove]
+
+    if save:
+        save_index()
+    return len(ids)
+
+
+@_locked
+def sync_index(save: bool = True) -> dict:
+    """Bring the index in line with DATA_DIR: embed new files, drop deleted ones."""
+    _ensure_index()
+    on_disk = _list_images()
+    present = set(on_disk)
+    removed = remove_images([p for p in _image_paths if p not in present], save=False)
+    added = add_images(on_disk, save=False)
+    if save and (added or removed):
+        save_index()
+    return {"added": added, "removed": removed, "total": len(_image_paths)}
+
+
+@_locked
 def save_index() -> None:
     """Persist FAISS index and metadata to disk."""
     if _index is None:
@@ -60,36 +315,172 @@ def save_index() -> None:
     faiss.write_index(_index, INDEX_FILE)
     with open(META_FILE, "wb") as f:
         pickle.dump(_image_paths, f)
+    with open(CONFIG_FILE, "w") as f:
+        json.dump(_index_config, f)
 
 
+@_locked
 def load_index() -> None:
     """Load FAISS index and metadata from disk if available."""
-    global _index, _image_paths
+    global _index, _image_paths, _index_config
     if not (os.path.exists(INDEX_FILE) and os.path.exists(META_FILE)):
         raise RuntimeError("No saved index found. Build it first.")
 
     _index = faiss.read_index(INDEX_FILE)
     with open(META_FILE, "rb") as f:
         _image_paths = pickle.load(f)
+    # Indexes saved before index types existed are exact flat L2 indexes
+    _index_config = {"type": "flat"}
+    if os.path.exists(CONFIG_FILE):
+        with open(CONFIG_FILE) as f:
+            _index_config = json.load(f)
+    _index_config.setdefault("metric", "l2")
 
 
-def find_similar(image_path: str, top_k: int = 5) -> List[Tuple[str, float]]:
+def get_query_embedding(image: Union[str, Image.Image], image_hash: Optional[str] = None) -> np.ndarray:
     """
-    Find top_k similar images from the dataset.
-    Returns list of (image_path, distance).
+    CLIP embedding of a query image. When the upload's content hash is given,
+    the embedding is looked up in / stored to embedding_cache.
     """
-    global _index
-    if _index is None:
-        try:
-            load_index()
-        except RuntimeError:
-            build_index()
+    key = f"{CLIP_MODEL}:{image_hash}" if image_hash else None
+    if key is not None:
+        cached = embedding_cache.get(key)
+        if cached is not None:
+            return np.array([cached], dtype="float32")
+
+    embedding = _get_embedding(image)
+    if key is not None:
+        embedding_cache.set(key, embedding[0].tolist())
+    return embedding
+
+
+def find_similar(
+    image: Union[str, Image.Image],
+    top_k: int = 5,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    image_hash: Optional[str] = None,
+) -> List[Tuple[str, float]]:
+    """
+    Find top_k similar images from the dataset for a query image path or PIL image.
+    nprobe (IVF) / ef_search (HNSW) trade recall for latency on ANN indexes.
+    image_hash (the upload's content hash) enables the query embedding cache.
+    Returns list of (image_path, score): L2 distance, or cosine similarity
+    for "ip" indexes.
+    """
+    _ensure_index()
 
-    query_vec = _get_embedding(image_path)
-    distances, indices = _index.search(query_vec, top_k)
+    # The CLIP forward pass runs unlocked; only the (fast) search holds the lock
+    embedding = get_query_embedding(image, image_hash)
+    with _index_lock:
+        query_vec = _normalize(embedding, _index_config["metric"])
+        params = _search_params(_index_config, nprobe, ef_search)
+        distances, indices = _index.search(query_vec, top_k, params=params)
+        image_paths = _image_paths
 
     results = []
     for idx, dist in zip(indices[0], distances[0]):
-        results.append((_image_paths[idx], float(dist)))
+        if idx < 0:  # fewer than top_k images indexed
+            continue
+        results.append((image_paths[idx], float(dist)))
 
     return results
+
+
+def benchmark_index(
+    index_type: str,
+    top_k: int = 10,
+    num_queries: int = 100,
+    sweep: Optional[List[int]] = None,
+    **params,
+) -> List[dict]:
+    """
+    Recall@top_k and per-query latency of an ANN index type over the current
+    gallery, against the exact flat index. IVF types are measured for each
+    nprobe in sweep, HNSW for each efSearch.
+    """
+    _ensure_index()
+    metric = params.pop("metric", None) or _index_config["metric"]
+    if _index_config["type"] in ("flat", "ivf", "hnsw") and _index_config["metric"] == metric:
+        vectors = _stored_vectors(_index)
+    else:
+        # PQ only keeps approximations and normalized vectors can't be turned
+        # back into raw ones; ground truth needs freshly embedded vectors
+        _, vectors = _embed_paths(list(_image_paths))
+        vectors = _normalize(vectors, metric)
+
+    n, d = vectors.shape
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(n, size=min(num_queries, n), replace=False)]
+    k = min(top_k, n)
+
+    def measure(index, search_params=None):
+        found = []
+        start = time.perf_counter()
+        for q in queries:
+            _, indices = index.search(q[None, :], k, params=search_params)
+            found.append(indices[0])
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        return np.array(found), latency_ms
+
+    flat, _ = _make_index("flat", d, n, metric)
+    flat.add(vectors)
+    truth, flat_ms = measure(flat)
+    report = [{"type": "flat", "metric": metric, "recall": 1.0, "latency_ms": round(flat_ms, 4),
+               "index_bytes": int(faiss.serialize_index(flat).nbytes)}]
+
+    index, config = _make_index(index_type, d, n, metric, **params)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    index_bytes = int(faiss.serialize_index(index).nbytes)
+
+    if config["type"] in ("ivf", "ivfpq"):
+        knob, values = "nprobe", [v for v in (sweep or [1, 2, 4, 8, 16, 32, 64]) if v <= config["nlist"]]
+    elif config["type"] == "hnsw":
+        knob, values = "ef_search", sweep or [16, 32, 64, 128, 256]
+    else:
+        knob, values = None, [None]
+
+    for value in values:
+        search_params = _search_params(config, **({knob: value} if knob else {}))
+        found, latency_ms = measure(index, search_params)
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        row = {**config, "recall": round(float(recall), 4), "latency_ms": round(latency_ms, 4),
+               "index_bytes": index_bytes}
+        if knob:
+            row[knob] = value
+        report.append(row)
+
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or benchmark the image similarity index")
+    parser.add_argument("command", choices=["build", "sync", "benchmark"])
+    parser.add_argument("--type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    parser.add_argument("--metric", choices=INDEX_METRICS)
+    parser.add_argument("--nlist", type=int)
+    parser.add_argument("--nprobe", type=int)
+    parser.add_argument("--hnsw-m", type=int)
+    parser.add_argument("--ef-search", type=int)
+    parser.add_argument("--pq-m", type=int)
+    parser.add_argument("--pq-nbits", type=int)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    index_params = {
+        name: value
+        for name, value in vars(args).items()
+        if name in ("nlist", "nprobe", "hnsw_m", "ef_search", "pq_m", "pq_nbits") and value is not None
+    }
+    if args.command == "build":
+        build_index(index_type=args.type, metric=args.metric, **index_params)
+        print(f"Built {_index_config} index over {len(_image_paths)} images")
+    elif args.command == "sync":
+        print(sync_index())
+    else:
+        for row in benchmark_index(args.type, top_k=args.top_k, metric=args.metric, **index_params):
+            print(json.dumps(row))
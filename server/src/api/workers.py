@@ -0,0 +1,126 @@
+# src/api/workers.py
+"""
+Process pool for the CPU-bound OpenCV/render jobs in src.api.jobs.
+
+Routes await `worker_pool.run(job, *args)` instead of calling the job on the
+event loop. The pool admits at most KOLAM_MAX_PENDING_JOBS jobs at once
+(running + queued); beyond that requests are rejected with 503 so a burst of
+heavy uploads can't starve light endpoints like /api/auth/login. Jobs that
+take longer than KOLAM_JOB_TIMEOUT seconds fail with 504.
+
+A process can't be told to stop a job it has started, so a timed-out job
+that is already running recycles the pool: its workers are terminated and
+a fresh pool takes later jobs. Other jobs running at that moment fail with
+503 and can be retried. Without this, repeated timeouts would leave every
+worker stuck and the pool would only ever answer 503.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+
+WORKER_PROCESSES = int(os.environ.get("KOLAM_WORKER_PROCESSES", str(os.cpu_count() or 1)))
+MAX_PENDING_JOBS = int(os.environ.get("KOLAM_MAX_PENDING_JOBS", str(4 * WORKER_PROCESSES)))
+JOB_TIMEOUT = float(os.environ.get("KOLAM_JOB_TIMEOUT", "60"))
+
+
+class WorkerPool:
+    """Bounded ProcessPoolExecutor with per-job timeouts and rejection when saturated."""
+
+    def __init__(self, processes: int, max_pending: int, timeout: float):
+        self.processes = max(1, processes)
+        self.max_pending = max(1, max_pending)
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.stats = {"submitted": 0, "finished": 0, "rejected": 0, "timed_out": 0, "failed": 0, "recycled": 0}
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn keeps workers free of the parent's torch/CLIP state
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _job_done(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self.stats["finished"] += 1
+
+    async def run(self, fn, *args):
+        """Runs fn(*args) in a worker process and returns its result."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server is busy processing other images, please retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+            self.stats["submitted"] += 1
+
+        executor = self.executor
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._reset(executor)
+            self._job_done(None)
+            raise HTTPException(status_code=503, detail="Worker pool restarted, please retry")
+        # Queue depth is released when the job really finishes, even after a timeout
+        future.add_done_callback(self._job_done)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            if not future.cancel():
+                # Already running: the only way to free its worker is to kill it
+                if self._reset(executor, terminate=True):
+                    self.stats["recycled"] += 1
+            raise HTTPException(status_code=504, detail=f"Image processing timed out after {self.timeout:g}s")
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge upload, or a recycle); start a fresh pool for later jobs
+            self._reset(executor)
+            self.stats["failed"] += 1
+            raise HTTPException(status_code=503, detail="Worker pool restarted, please retry")
+
+    def _reset(self, executor: ProcessPoolExecutor, terminate: bool = False) -> bool:
+        """
+        Drops executor (if it's still the current pool) so the next job starts
+        a fresh one. Returns False if it had already been replaced.
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return False
+            self._executor = None
+        processes = list((executor._processes or {}).values()) if terminate else []
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+        return True
+
+    def status(self) -> dict:
+        return {
+            "processes": self.processes,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "timeout": self.timeout,
+            **self.stats,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+worker_pool = WorkerPool(WORKER_PROCESSES, MAX_PENDING_JOBS, JOB_TIMEOUT)
@@ -0,0 +1,153 @@
+"""
+Export the trained SimpleCNN for CPU serving.
+
+Run from the server directory after train.py:
+
+    python -m src.model.export                      # all formats
+    python -m src.model.export --formats int8 onnx
+
+Writes next to simplecnn.pth:
+- simplecnn_int8.pt   TorchScript, Linear layers dynamically quantized to int8
+                      (fc1 holds almost all the weights: ~16 MB fp32 -> ~4 MB)
+- simplecnn.ts        TorchScript fp32, frozen (weights inlined as constants)
+- simplecnn.onnx      ONNX graph with a dynamic batch axis, for onnxruntime
+
+Each artifact is checked against the fp32 model on the ImageFolder data
+(top-1 agreement, accuracy, max logit difference, latency) and only saved
+if it agrees on at least --min-agreement of the images.
+Select one for serving with KOLAM_CNN_BACKEND (see src/api/inference.py).
+"""
+import argparse
+import os
+import time
+
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader
+
+from src.model.model import SimpleCNN
+
+BASE_DIR = os.path.dirname(__file__)
+SAVE_DIR = os.path.join(BASE_DIR, "saved")
+WEIGHTS_PATH = os.path.join(SAVE_DIR, "simplecnn.pth")
+
+ARTIFACTS = {
+    "int8": os.path.join(SAVE_DIR, "simplecnn_int8.pt"),
+    "torchscript": os.path.join(SAVE_DIR, "simplecnn.ts"),
+    "onnx": os.path.join(SAVE_DIR, "simplecnn.onnx"),
+}
+
+INPUT_SHAPE = (1, 3, 128, 128)
+
+
+def load_fp32(num_classes: int) -> SimpleCNN:
+    model = SimpleCNN(num_classes=num_classes)
+    model.load_state_dict(torch.load(WEIGHTS_PATH, map_location="cpu"))
+    model.eval()
+    return model
+
+
+def export_int8(model: SimpleCNN, path: str) -> None:
+    quantized = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    traced = torch.jit.trace(quantized, torch.randn(INPUT_SHAPE))
+    torch.jit.save(traced, path)
+
+
+def export_torchscript(model: SimpleCNN, path: str) -> None:
+    traced = torch.jit.trace(model, torch.randn(INPUT_SHAPE))
+    torch.jit.save(torch.jit.freeze(traced), path)
+
+
+def export_onnx(model: SimpleCNN, path: str) -> None:
+    torch.onnx.export(
+        model,
+        (torch.randn(INPUT_SHAPE),),
+        path,
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        dynamo=False,
+    )
+
+
+EXPORTERS = {"int8": export_int8, "torchscript": export_torchscript, "onnx": export_onnx}
+
+
+def load_artifact(backend: str, path: str):
+    """Returns a callable mapping a float32 NCHW batch to logits."""
+    if backend == "onnx":
+        import onnxruntime
+
+        session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        return lambda batch: torch.from_numpy(session.run(None, {"input": batch.numpy()})[0])
+    return torch.jit.load(path, map_location="cpu")
+
+
+def run(model, loader) -> tuple:
+    """Logits and labels for the whole dataset, plus ms per image."""
+    logits, labels = [], []
+    elapsed = 0.0
+    with torch.no_grad():
+        for inputs, targets in loader:
+            start = time.perf_counter()
+            logits.append(model(inputs))
+            elapsed += time.perf_counter() - start
+            labels.append(targets)
+    logits, labels = torch.cat(logits), torch.cat(labels)
+    return logits, labels, elapsed * 1000 / len(labels)
+
+
+def parity(reference: tuple, candidate: tuple) -> dict:
+    ref_logits, labels, ref_ms = reference
+    logits, _, ms = candidate
+    ref_pred, pred = ref_logits.argmax(1), logits.argmax(1)
+    return {
+        "agreement": (pred == ref_pred).float().mean().item(),
+        "accuracy": (pred == labels).float().mean().item(),
+        "fp32_accuracy": (ref_pred == labels).float().mean().item(),
+        "max_logit_diff": (logits - ref_logits).abs().max().item(),
+        "ms_per_image": round(ms, 3),
+        "fp32_ms_per_image": round(ref_ms, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export SimpleCNN for CPU serving")
+    parser.add_argument("--formats", nargs="+", choices=list(EXPORTERS), default=list(EXPORTERS))
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    # Imported here: building the ImageFolder dataset scans every image, and
+    # inference.py imports this module only for load_artifact
+    from src.model.utils import dataset
+
+    model = load_fp32(len(dataset.classes))
+    loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=False)
+    reference = run(model, loader)
+    print(f"fp32: {os.path.getsize(WEIGHTS_PATH) / 1e6:.1f} MB, "
+          f"accuracy {parity(reference, reference)['fp32_accuracy']:.4f}")
+
+    failed = False
+    for backend in args.formats:
+        path = ARTIFACTS[backend]
+        tmp_path = path + ".tmp"
+        EXPORTERS[backend](model, tmp_path)
+        report = parity(reference, run(load_artifact(backend, tmp_path), loader))
+        size_mb = os.path.getsize(tmp_path) / 1e6
+        print(f"{backend}: {size_mb:.1f} MB, {report}")
+
+        if report["agreement"] < args.min_agreement:
+            print(f"⚠️ {backend} agrees with fp32 on only {report['agreement']:.4f} of images, not saved")
+            os.remove(tmp_path)
+            failed = True
+            continue
+        os.replace(tmp_path, path)
+        print(f"Saved {path}")
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,99 @@
+import argparse
 import torch
 import torch.nn as nn
 import torch.optim as optim
 from model import SimpleCNN
-from utils import dataloader, dataset
+from utils import NUM_WORKERS, make_loaders
+import json
 import os
+import time
 
 BASE_DIR = os.path.dirname(__file__)
 SAVE_DIR = os.path.join(BASE_DIR, "saved")
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model = SimpleCNN(num_classes=len(dataset.classes)).to(device)
-criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.parameters(), lr=0.001)
-
-for epoch in range(10):
-    for inputs, labels in dataloader:
-        inputs, labels = inputs.to(device), labels.to(device)
-        optimizer.zero_grad()
-        outputs = model(inputs)
-        loss = criterion(outputs, labels)
-        loss.backward()
-        optimizer.step()
-    print(f"Epoch {epoch+1}, Loss: {loss.item():.4f}")
-
-
-os.makedirs(SAVE_DIR, exist_ok=True)
-save_path = os.path.join(SAVE_DIR, "simplecnn.pth")
-torch.save(model.state_dict(), save_path)
-print(f"Model saved at {save_path}")
\ No newline at end of file
+
+def evaluate(model, val_loader, criterion, device):
+    """Mean loss and accuracy on the validation split."""
+    model.eval()
+    total_loss, correct, seen = 0.0, 0, 0
+    with torch.no_grad():
+        for inputs, labels in val_loader:
+            inputs, labels = inputs.to(device, non_blocking=True), labels.to(device, non_blocking=True)
+            outputs = model(inputs)
+            total_loss += criterion(outputs, labels).item() * len(labels)
+            correct += (outputs.argmax(1) == labels).sum().item()
+            seen += len(labels)
+    return total_loss / seen, correct / seen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train SimpleCNN on src/model/data")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--patience", type=int, default=5, help="stop after this many epochs without a better val loss")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=0.001)
+    parser.add_argument("--val-fraction", type=float, default=0.2)
+    parser.add_argument("--num-workers", type=int, default=NUM_WORKERS)
+    args = parser.parse_args()
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    train_loader, val_loader, classes = make_loaders(args.val_fraction, args.batch_size, args.num_workers)
+    model = SimpleCNN(num_classes=len(classes)).to(device)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=args.lr)
+
+    os.makedirs(SAVE_DIR, exist_ok=True)
+    save_path = os.path.join(SAVE_DIR, "simplecnn.pth")
+    classes_path = os.path.join(SAVE_DIR, "classes.json")
+
+    # Class names for inference, so the server doesn't need the dataset to map outputs.
+    # Written before the first checkpoint, so saved weights never sit next to a stale manifest
+    with open(classes_path, "w") as f:
+        json.dump({"classes": classes}, f)
+    print(f"Classes saved at {classes_path}")
+
+    best_loss = float("inf")
+    stale_epochs = 0
+
+    for epoch in range(args.epochs):
+        model.train()
+        start = time.perf_counter()
+        total_loss, seen = 0.0, 0
+        for inputs, labels in train_loader:
+            inputs, labels = inputs.to(device, non_blocking=True), labels.to(device, non_blocking=True)
+            optimizer.zero_grad()
+            outputs = model(inputs)
+            loss = criterion(outputs, labels)
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(labels)
+            seen += len(labels)
+        elapsed = time.perf_counter() - start
+        train_loss = total_loss / seen
+
+        if val_loader is not None:
+            val_loss, val_acc = evaluate(model, val_loader, criterion, device)
+            print(f"Epoch {epoch+1}, Loss: {train_loss:.4f}, Val loss: {val_loss:.4f}, "
+                  f"Val acc: {val_acc:.4f}, {seen / elapsed:.1f} images/sec")
+        else:
+            # No held-out data: track the training loss instead
+            val_loss = train_loss
+            print(f"Epoch {epoch+1}, Loss: {train_loss:.4f}, {seen / elapsed:.1f} images/sec")
+
+        if val_loss < best_loss:
+            best_loss = val_loss
+            stale_epochs = 0
+            torch.save(model.state_dict(), save_path)
+            print(f"Best model so far saved at {save_path}")
+        else:
+            stale_epochs += 1
+            if stale_epochs >= args.patience:
+                print(f"No improvement for {args.patience} epochs, stopping early")
+                break
+
+    print(f"Best model (val loss {best_loss:.4f}) at {save_path}")
+
+
+if __name__ == "__main__":
+    # Guarded so DataLoader workers started with spawn don't re-run training
+    main()
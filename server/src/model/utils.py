@@ -1,14 +1,128 @@
+import json
 import os
+import numpy as np
+import torch
 from torchvision import datasets, transforms
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Dataset, Subset, random_split
 
 BASE_DIR = os.path.dirname(__file__)
 DATA_DIR = os.path.join(BASE_DIR, "data")
+# Decoded, resized images for training, rebuilt only for new or changed files
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+
+IMAGE_SIZE = 128
+NUM_WORKERS = min(4, os.cpu_count() or 1)
 
 transform = transforms.Compose([
-    transforms.Resize((128, 128)),
+    transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
     transforms.ToTensor()
 ])
 
 dataset = datasets.ImageFolder(DATA_DIR, transform=transform)
-dataloader = DataLoader(dataset, batch_size=32, shuffle=True)
+
+
+def _file_key(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def build_tensor_cache(dataset: datasets.ImageFolder = dataset, cache_dir: str = CACHE_DIR, num_workers: int = NUM_WORKERS) -> str:
+    """
+    Writes every image of the dataset, decoded and resized, to a memory-mapped
+    uint8 array (cache_dir/images.npy, N x 3 x 128 x 128) plus labels.npy.
+    Images already cached with the same size and mtime are copied over instead
+    of being decoded again, so a growing dataset only pays for its new files.
+    Returns cache_dir.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    images_path = os.path.join(cache_dir, "images.npy")
+    labels_path = os.path.join(cache_dir, "labels.npy")
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+
+    files = [[path, *_file_key(path)] for path, _ in dataset.samples]
+    manifest = {"classes": dataset.classes, "image_size": IMAGE_SIZE, "files": files}
+
+    old_rows, old_images = {}, None
+    if os.path.exists(manifest_path) and os.path.exists(images_path):
+        with open(manifest_path) as f:
+            old = json.load(f)
+        if old == manifest:
+            return cache_dir
+        if old.get("image_size") == IMAGE_SIZE:
+            old_rows = {tuple(entry): row for row, entry in enumerate(old["files"])}
+            old_images = np.load(images_path, mmap_mode="r")
+
+    shape = (len(files), 3, IMAGE_SIZE, IMAGE_SIZE)
+    tmp_path = images_path + ".tmp.npy"
+    images = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=shape)
+
+    missing = []
+    for row, entry in enumerate(files):
+        old_row = old_rows.get(tuple(entry))
+        if old_row is None:
+            missing.append(row)
+        else:
+            images[row] = old_images[old_row]
+
+    if missing:
+        print(f"Decoding {len(missing)} of {len(files)} images into {cache_dir}")
+        loader = DataLoader(Subset(dataset, missing), batch_size=64, num_workers=num_workers)
+        offset = 0
+        for batch, _ in loader:
+            rows = missing[offset:offset + len(batch)]
+            # ToTensor divides uint8 by 255, so this round trip is exact
+            images[rows] = (batch * 255).round().to(torch.uint8).numpy()
+            offset += len(batch)
+
+    images.flush()
+    del images, old_images
+    os.replace(tmp_path, images_path)
+    np.save(labels_path, np.array(dataset.targets, dtype=np.int64))
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    return cache_dir
+
+
+class CachedImageDataset(Dataset):
+    """Images from build_tensor_cache as float tensors, same values as `transform`."""
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.labels = np.load(os.path.join(cache_dir, "labels.npy"))
+        with open(os.path.join(cache_dir, "manifest.json")) as f:
+            self.classes = json.load(f)["classes"]
+        self._images = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, index):
+        if self._images is None:
+            # Opened lazily so each DataLoader worker maps the file itself
+            self._images = np.load(os.path.join(self.cache_dir, "images.npy"), mmap_mode="r")
+        image = torch.from_numpy(np.array(self._images[index])).float().div_(255)
+        return image, int(self.labels[index])
+
+
+def make_loaders(val_fraction: float = 0.2, batch_size: int = 32, num_workers: int = NUM_WORKERS, seed: int = 0):
+    """
+    Train/validation DataLoaders over the cached tensors, split at random
+    with a fixed seed so the held-out images stay the same between runs.
+    Returns (train_loader, val_loader, classes); val_loader is None when
+    val_fraction is 0.
+    """
+    cached = CachedImageDataset(build_tensor_cache(num_workers=num_workers))
+    val_size = int(len(cached) * val_fraction)
+    train_set, val_set = random_split(
+        cached, [len(cached) - val_size, val_size], generator=torch.Generator().manual_seed(seed)
+    )
+
+    options = {
+        "batch_size": batch_size,
+        "num_workers": num_workers,
+        "pin_memory": torch.cuda.is_available(),
+        "persistent_workers": num_workers > 0,
+    }
+    train_loader = DataLoader(train_set, shuffle=True, **options)
+    val_loader = DataLoader(val_set, shuffle=False, **options) if val_size else None
+    return train_loader, val_loader, cached.classes
@@ -0,0 +1,52 @@
+import numpy as np
+
+import src.api.recreate_logic as recreate_logic
+from src.api.geometry import PathArrays, canonical_keys, unique_rows
+
+
+def grid_dots(n, start=50, stop=450):
+    step = (stop - start) / (n - 1)
+    return [(start + col * step, start + row * step) for row in range(n) for col in range(n)]
+
+
+def recreate_paths(monkeypatch, dots):
+    """Runs a seeded recreation and returns the PathArrays handed to the renderer."""
+    rendered = {}
+    monkeypatch.setattr(recreate_logic, "render_kolam", lambda dots, paths: rendered.setdefault("paths", paths))
+    recreator = recreate_logic.KolamRecreator(seed=1)
+    recreator.recreate(dots, np.zeros((500, 500, 3), np.uint8))
+    return recreator, rendered["paths"]
+
+
+def test_reversed_paths_share_a_key():
+    line = np.array([[1.0, 2.0, 3.0, 4.0], [3.0, 4.0, 1.0, 2.0]])
+    assert (canonical_keys(line)[0] == canonical_keys(line)[1]).all()
+
+    curve = np.array([[0.0, 0.0, 5.0, 9.0, 10.0, 0.0], [10.0, 0.0, 5.0, 9.0, 0.0, 0.0]])
+    assert (canonical_keys(curve)[0] == canonical_keys(curve)[1]).all()
+
+
+def test_curves_differ_only_by_bulge_side():
+    curves = np.array([
+        [0.0, 0.0, 5.0, 2.0, 10.0, 0.0],
+        [0.0, 0.0, 5.0, 3.7, 10.0, 0.0],   # same side, different bulge: duplicate
+        [0.0, 0.0, 5.0, -2.0, 10.0, 0.0],  # other side: kept
+    ])
+    assert unique_rows(curves).tolist() == [curves[0].tolist(), curves[2].tolist()]
+
+
+def test_regular_grids_lose_duplicate_loops(monkeypatch):
+    for n in (5, 7, 9, 11):
+        recreator, paths = recreate_paths(monkeypatch, grid_dots(n))
+        stats = recreator.last_stats
+        assert stats["duplicates_removed"] > 0
+        assert stats["paths"] == len(paths)
+
+        # No two loops left join the same dots on the same side
+        keys = canonical_keys(paths.curves)
+        assert len(np.unique(keys, axis=0)) == len(keys)
+
+
+def test_deduplicate_keeps_first_in_order():
+    arrays = PathArrays(curves=[[0, 0, 5, 2, 10, 0], [20, 0, 25, 2, 30, 0], [10, 0, 5, 1, 0, 0]])
+    assert arrays.deduplicate().curves.tolist() == arrays.curves[:2].tolist()
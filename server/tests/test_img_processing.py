@@ -0,0 +1,144 @@
+"""
+The indexed/hashed detection helpers must give exactly what the pairwise
+scans they replaced gave. The reference versions below are those scans.
+"""
+import math
+import random
+
+import cv2
+import numpy as np
+
+from src.api.img_processing import (
+    CURVE_TOLERANCE,
+    DOT_MERGE_EPS,
+    DotIndex,
+    KolamAnalysis,
+    detect_lines_and_curves,
+    find_closest_dot,
+    merge_close_points,
+    remove_duplicate_curves,
+    remove_duplicate_lines,
+)
+from src.api.schemas import CurvePath, Dot, LinePath
+
+
+def reference_duplicate_lines(lines):
+    unique_lines = []
+    for line in lines:
+        if not any(
+            (line.p1 == existing.p1 and line.p2 == existing.p2) or
+            (line.p1 == existing.p2 and line.p2 == existing.p1)
+            for existing in unique_lines
+        ):
+            unique_lines.append(line)
+    return unique_lines
+
+
+def reference_duplicate_curves(curves, tolerance=CURVE_TOLERANCE):
+    unique_curves = []
+    for curve in curves:
+        if not any(
+            all(abs(getattr(getattr(curve, p), a) - getattr(getattr(existing, p), a)) < tolerance
+                for p in ("p1", "p2", "ctrl") for a in ("x", "y"))
+            for existing in unique_curves
+        ):
+            unique_curves.append(curve)
+    return unique_curves
+
+
+def reference_merge(points, eps=DOT_MERGE_EPS):
+    """DBSCAN(eps, min_samples=1): clusters are chains of points within eps, in first-seen order."""
+    labels = [None] * len(points)
+    clusters = []
+    for start in range(len(points)):
+        if labels[start] is not None:
+            continue
+        labels[start] = len(clusters)
+        members, queue = [], [start]
+        while queue:
+            i = queue.pop()
+            members.append(i)
+            for j in range(len(points)):
+                if labels[j] is None and math.dist(points[i], points[j]) <= eps:
+                    labels[j] = labels[start]
+                    queue.append(j)
+        clusters.append(members)
+    return [
+        (int(np.mean([points[i][0] for i in members])), int(np.mean([points[i][1] for i in members])))
+        for members in clusters
+    ]
+
+
+def random_dot(rng, step=10, size=30):
+    # Coarse coordinates, so shared endpoints and near-duplicates are common
+    return Dot(x=float(rng.randrange(size) * step), y=float(rng.randrange(size) * step))
+
+
+def test_remove_duplicate_lines_matches_pairwise_scan():
+    rng = random.Random(0)
+    for _ in range(20):
+        lines = [LinePath(p1=random_dot(rng, size=6), p2=random_dot(rng, size=6)) for _ in range(200)]
+        assert remove_duplicate_lines(lines) == reference_duplicate_lines(lines)
+
+
+def test_remove_duplicate_curves_matches_pairwise_scan():
+    rng = random.Random(1)
+    for _ in range(20):
+        curves = []
+        for _ in range(300):
+            p1, ctrl, p2 = (Dot(x=rng.uniform(0, 60), y=rng.uniform(0, 60)) for _ in range(3))
+            curves.append(CurvePath(p1=p1, ctrl=ctrl, p2=p2))
+        assert remove_duplicate_curves(curves) == reference_duplicate_curves(curves)
+
+
+def test_merge_close_points_matches_dbscan():
+    rng = random.Random(2)
+    for _ in range(20):
+        points = [(rng.randrange(300), rng.randrange(300)) for _ in range(rng.randrange(1, 250))]
+        assert merge_close_points(points) == reference_merge(points)
+
+
+def test_dot_index_snap_matches_linear_scan():
+    rng = random.Random(3)
+    # A regular grid makes equidistant dots (ties) frequent
+    dots = [Dot(x=float(x), y=float(y)) for y in range(0, 200, 20) for x in range(0, 200, 20)]
+    index = DotIndex([(d.x, d.y) for d in dots])
+    points = [(rng.randrange(-20, 220), rng.randrange(-20, 220)) for _ in range(2000)]
+    points += [(10, 10), (30, 50), (190, 190)]
+    assert index.snap(points) == [find_closest_dot(dots, p) for p in points]
+
+
+def test_dot_index_without_dots():
+    assert DotIndex([]).snap([(1, 2), (3, 4)]) == [None, None]
+
+
+def dot_grid_image(radius, size=900, step=150):
+    img = np.full((size, size, 3), 255, np.uint8)
+    for y in range(step, size, step):
+        for x in range(step, size, step):
+            cv2.circle(img, (x, y), radius, (0, 0, 0), -1, lineType=cv2.LINE_AA)
+    return img
+
+
+def test_refined_dot_sets_are_cached_separately():
+    img = dot_grid_image(radius=12)
+    analysis = KolamAnalysis(img, max_pixels=300 * 300, refine=True)
+    analysis.detect_dots(enhanced=True)
+    assert analysis.detect_dots() == KolamAnalysis(img, max_pixels=300 * 300, refine=True).detect_dots()
+
+
+def test_refine_recentres_dots_larger_than_the_default_window():
+    # r=30 at scale 1/3 is a 10 px dot in detection, wider than DOT_WINDOW
+    img = dot_grid_image(radius=30)
+    dots = KolamAnalysis(img, max_pixels=300 * 300, refine=True).detect_dots()
+    expected = {(x, y) for y in range(150, 900, 150) for x in range(150, 900, 150)}
+    assert set(dots) == expected
+
+
+def test_paths_are_cached_per_dot_set():
+    img = dot_grid_image(radius=12)
+    cv2.line(img, (150, 150), (750, 150), (0, 0, 0), 3)
+    analysis = KolamAnalysis(img)
+    assert analysis.detect_paths() is analysis.detect_paths()
+    expected = detect_lines_and_curves(img, analysis.detect_dots(enhanced=True))
+    assert analysis.detect_paths(enhanced=True) == expected
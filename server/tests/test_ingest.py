@@ -0,0 +1,29 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from src.api.ingest import open_image
+
+
+def png_bytes(size):
+    buffer = BytesIO()
+    Image.new("RGB", size, "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_open_image_returns_rgb():
+    image = open_image(png_bytes((4, 3)))
+    assert image.mode == "RGB" and image.size == (4, 3)
+
+
+def test_open_image_rejects_non_images():
+    with pytest.raises(ValueError):
+        open_image(b"not an image")
+
+
+def test_open_image_rejects_decompression_bombs(monkeypatch):
+    # PIL refuses images over twice MAX_IMAGE_PIXELS outright
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    with pytest.raises(ValueError):
+        open_image(png_bytes((100, 100)))
@@ -0,0 +1,51 @@
+import random
+
+import numpy as np
+
+from src.api.lattice import Lattice
+from src.api.recreate_logic import KolamRecreator, Point
+
+
+def sparse_grid(rng, n=11, missing=0.1, jitter=0.0, start=50, stop=450):
+    """An n x n grid with a fraction of its dots dropped, as if detection missed them."""
+    step = (stop - start) / (n - 1)
+    dots = [
+        (start + col * step + rng.uniform(-jitter, jitter), start + row * step + rng.uniform(-jitter, jitter))
+        for row in range(n) for col in range(n)
+    ]
+    return [dot for dot in dots if rng.random() >= missing]
+
+
+def compare_with_pairwise_scan(jitter):
+    """Yields (lattice result, pairwise scan result) as points for every dot of sparse grids."""
+    recreator = KolamRecreator()
+    for seed in range(20):
+        dots = sparse_grid(random.Random(seed), jitter=jitter)
+        points = [Point(x, y) for x, y in dots]
+        lattice = Lattice.fit(np.asarray(dots))
+        assert lattice is not None
+        for i, point in enumerate(points):
+            found = lattice.neighbours(i, recreator.proximity_threshold)
+            assert found is not None
+            yield {key: points[j] for key, j in found.items()}, recreator._find_neighbors(point, points)
+
+
+def test_neighbours_match_pairwise_scan_with_missing_dots():
+    for found, expected in compare_with_pairwise_scan(jitter=0.0):
+        assert found == expected
+
+
+def test_no_neighbour_lost_on_a_jittered_grid():
+    # Jitter can flip near-ties (the scan compares dx or dy, the lattice the
+    # full distance), but every dot must still find the same axes
+    for found, expected in compare_with_pairwise_scan(jitter=1.0):
+        assert found.keys() == expected.keys()
+
+
+def test_neighbours_bridge_gaps_up_to_max_distance():
+    # Row 0 is missing the dots at x=40 and x=80
+    dots = [(0.0, 0.0), (120.0, 0.0)] + [(x * 40.0, y * 40.0) for y in (1, 2) for x in range(4)]
+    lattice = Lattice.fit(np.asarray(dots))
+    assert lattice.neighbours(0, 130)["x_neighbor"] == 1
+    assert "x_neighbor" not in lattice.neighbours(0, 100)
+    assert lattice.neighbours(0, 100)["y_neighbor"] == 2
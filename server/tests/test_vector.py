@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("clip")
+
+import src.api.vector as vector
+
+
+@pytest.fixture
+def gallery(monkeypatch):
+    """A random gallery, embedded without CLIP; returns (paths, vectors)."""
+    def make(n):
+        rng = np.random.default_rng(0)
+        paths = [f"imgdata/{i}.png" for i in range(n)]
+        embeddings = rng.standard_normal((n, vector.EMBEDDING_DIM)).astype("float32")
+        monkeypatch.setattr(vector, "_list_images", lambda: paths)
+        monkeypatch.setattr(vector, "_embed_paths", lambda image_paths: (list(image_paths), embeddings))
+        return paths, embeddings
+    monkeypatch.setattr(vector, "_index", None)
+    monkeypatch.setattr(vector, "_image_paths", [])
+    monkeypatch.setattr(vector, "_index_config", {"type": "flat", "metric": "l2"})
+    return make
+
+
+@pytest.mark.parametrize("index_type", vector.INDEX_TYPES)
+@pytest.mark.parametrize("n", [20, 300])
+def test_every_index_type_builds_on_a_small_gallery(gallery, index_type, n):
+    paths, embeddings = gallery(n)
+    vector.build_index(save=False, index_type=index_type)
+
+    assert vector._index.ntotal == n
+    if vector._index_config["type"] == "ivfpq":
+        assert vector.MIN_TRAINING_POINTS * 2 ** vector._index_config["pq_nbits"] <= n
+
+    params = vector._search_params(vector._index_config)
+    _, ids = vector._index.search(embeddings[:1], 5, params=params)
+    assert len(ids[0]) == 5